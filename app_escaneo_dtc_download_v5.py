@@ -6,17 +6,44 @@
 # - Botón WhatsApp con pulsación cada 2s.
 #
 # Ejecutar:
-#   python app_escaneo_dtc_download_v5.py
+#   python arranque_dtc.py                     # desarrollo (uvicorn, un proceso, arranque rápido)
+#   gunicorn -c gunicorn.conf.py               # producción (WEB_CONCURRENCY workers)
+#   python app_escaneo_dtc_download_v5.py      # igual que arranque_dtc.py pero cargando todo antes del bind
 
-from pywebio import start_server
 from pywebio.output import (
     put_markdown, put_html, put_text, put_button, use_scope,
-    put_row, put_table, popup, close_popup, toast, put_file
+    put_row, put_table, popup, close_popup, toast, put_loading, clear, put_scope, remove
 )
 from pywebio.input import input, input_group, TEXT
-from pywebio.session import set_env, run_js
+from pywebio.session import set_env, local, defer_call, get_current_session
+from pywebio.pin import put_input, pin_on_change
+import csv
+import hashlib
+import json
+import os
 import re
+import resource
+import atexit
+import multiprocessing
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturoVencido
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType, SimpleNamespace
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+import historial_dtc
+import kb_dtc
+import metricas_dtc as metricas
+from busqueda_dtc import IndiceTexto
+from correlacion_dtc import MotorReglas, Regla, cada
+from metricas_dtc import cronometro
 
 APP_TITLE = "Asistente de Escaneo — Base DTC Motor (P0001–P0999)"
 BRAND = "Si no tenes DTC solicita un escaneo en las redes!"
@@ -29,125 +56,168 @@ IG_URL = "https://www.instagram.com/cesar.check.engine?igsh=MTk1NHIwbWVkbmNqOA==
 FB_URL = "https://www.facebook.com/share/17DnSCk7Fu/"
 WA_URL = "https://wa.me/5491172379474?text=Hola!%20Quiero%20un%20escaneo%20vehicular."
 
-# =================== THEME ===================
-def setup_theme_and_social():
-    put_html(f"""
-    <style>
-      html, body {{
-        height: 100%;
-        margin: 0;
-        background:
-          radial-gradient(ellipse at center, rgba(0,0,0,0.55) 0%, rgba(0,0,0,0.78) 100%),
-          url('{UNSPLASH_MAIN}') no-repeat center center fixed;
-        background-size: cover;
-        color: #fff;
-        font-family: 'Segoe UI', Roboto, Arial, sans-serif;
-      }}
-      /* 🔳 Forzar transparencia global para eliminar fondo blanco residual */
-      * {{
-        background-color: transparent !important;
-      }}
-      /* Panel principal translúcido (sin borde) */
-      .pywebio-content {{
-        max-width: 920px;
-        margin: 6vh auto 16vh;
-        background: rgba(25,25,25,0.45);
-        backdrop-filter: blur(16px) saturate(160%);
-        -webkit-backdrop-filter: blur(16px) saturate(160%);
-        border-radius: 22px;
-        padding: 28px;
-        text-align: left;
-        box-shadow: 0 10px 36px rgba(0,0,0,0.65);
-      }}
-      h1, h2, h3, p {{ text-shadow: 0 2px 8px rgba(0,0,0,0.85); }}
-      .chip {{
-        display:inline-block; padding:6px 10px; border-radius:999px;
-        margin:2px 6px 2px 0; font-size:.9rem;
-        background: rgba(255,255,255,0.08);
-      }}
-      .chip b{{color:#fff}}
-
-      /* Tarjeta translúcida para cada resultado/segmento (sin borde) */
-      .card {{
-        background: rgba(25,25,25,0.45);
-        backdrop-filter: blur(12px) saturate(160%);
-        -webkit-backdrop-filter: blur(12px) saturate(160%);
-        border-radius: 16px;
-        padding: 14px 16px;
-        margin: 10px 0 14px;
-        box-shadow: 0 6px 20px rgba(0,0,0,0.35);
-      }}
-      .card ul, .card ol {{ margin: 6px 0 0 18px; }}
-      .card b {{ color: #fff; }}
-
-      /* --- Barra IG/FB (se mantiene sin blur) --- */
-      .social-bar {{
-        position: fixed;
-        left: 50%;
-        transform: translateX(-50%);
-        bottom: max(10px, env(safe-area-inset-bottom));
-        display: flex;
-        gap: 8px;
-        padding: 8px 10px;
-        background: rgba(0,0,0,0.20);
-        border-radius: 999px;
-        z-index: 998;
-        border: 1px solid rgba(255,255,255,0.18);
-      }}
-      .social-bar a {{
-        display: inline-flex; align-items: center; gap: 6px;
-        text-decoration: none; color: #fff;
-        padding: 6px 10px; border-radius: 999px;
-        font-size: 0.85rem; font-weight: 600;
-        transition: transform .15s ease;
-      }}
-      .social-bar a:hover {{ transform: scale(1.08); }}
-      .ig {{ background: #E1306C; }}
-      .fb {{ background: #1877F2; }}
-      .social-bar svg {{ width: 16px; height: 16px; fill: white; }}
-
-      /* --- Botón flotante WhatsApp con pulsación cada 2s --- */
-      .wa-fab {{
-        position: fixed; right: 18px;
-        bottom: max(18px, calc(env(safe-area-inset-bottom) + 18px));
-        width: 52px; height: 52px; border-radius: 50%;
-        background-color: #25D366 !important;
-        display: flex; align-items: center; justify-content: center;
-        box-shadow: 0 10px 24px rgba(0,0,0,0.5); z-index: 9999;
-        text-decoration: none; border: 2px solid rgba(255,255,255,0.25);
-      }}
-      .wa-fab svg {{ width: 24px; height: 24px; fill: #fff; }}
-      @keyframes wa-pulse {{
-        0% {{ transform: scale(1); box-shadow: 0 10px 24px rgba(0,0,0,0.5);}}
-        50% {{ transform: scale(1.12); box-shadow: 0 14px 28px rgba(0,0,0,0.55), 0 0 0 10px rgba(37,211,102,0.25);}}
-        100% {{ transform: scale(1); box-shadow: 0 10px 24px rgba(0,0,0,0.5);}}
-      }}
-      .wa-fab.pulse {{ animation: wa-pulse 2s ease-in-out infinite; }}
-
-      @media (max-width: 520px) {{
-        .pywebio-content {{ margin: 4vh 10px 16vh; padding: 22px; }}
-      }}
-    </style>
-
-    <!-- Barra social -->
-    <div class="social-bar">
-      <a class="ig" href="{IG_URL}" target="_blank" rel="noopener" aria-label="Instagram">
-        <svg viewBox="0 0 448 512"><path d="M224,202.66A53.34,53.34,0,1,0,277.34,256,53.38,53.38,0,0,0,224,202.66Zm124.71-41.37a31.11,31.11,0,1,0,31.11,31.11A31.11,31.11,0,0,0,348.71,161.29ZM398.8,80A93.2,93.2,0,0,0,368,64.47C335.86,53.67,265.71,48,224,48S112.14,53.67,80,64.47A93.2,93.2,0,0,0,49.2,80C36.91,92.28,24.63,114,21.2,148.06,17.29,188,16,233.38,16,256s1.29,68,5.2,107.94C24.63,398,36.91,419.72,49.2,432A93.2,93.2,0,0,0,80,447.53C112.14,458.33,182.29,464,224,464s112.14-5.67,144-16.47A93.2,93.2,0,0,0,398.8,432c12.29-12.28,24.57-34,28-68.06C429.71,324,431,278.62,431,256s-1.29,68-4.2-107.94C423.37,114,411.09,92.28,398.8,80ZM224,338.67A82.67,82.67,0,1,1,306.67,256,82.76,82.76,0,0,1,224,338.67Z"/></svg>
-        Instagram
-      </a>
-      <a class="fb" href="{FB_URL}" target="_blank" rel="noopener" aria-label="Facebook">
-        <svg viewBox="0 0 320 512"><path d="M279.14 288l14.22-92.66h-88.91V128c0-25.35 12.42-50.06 52.24-50.06H295V6.26S273.91 0 252.36 0c-73.22 0-121.07 44.38-121.07 124.72V195.3H56.89V288h74.4v224h92.66V288z"/></svg>
-        Facebook
-      </a>
-    </div>
-
-    <!-- Botón flotante WhatsApp con pulsación continua -->
-    <a class="wa-fab pulse" id="waFab" href="{WA_URL}" target="_blank" rel="noopener" aria-label="WhatsApp">
-      <svg viewBox="0 0 448 512">
-        <path d="M380.9 97.1C339-7.8 241.4-30.2 160 23.2 78.6 76.7 46.9 176 80.5 261.9l-19.4 70.3 72.1-18.9c47.6 25.6 104.1 27.9 152.2 6.3 88.8-41.2 127.5-145.1 95.5-222.5zM224 367.8c-26.8 0-52.9-6.6-76.2-19.1l-5.4-3-42.8 11.2 11.4-41.5-3.5-5.7C83.1 275.2 74.9 246 74.9 216c0-81.4 66.4-147.8 147.8-147.8s147.8 66.4 147.8 147.8S305.4 367.8 224 367.8zM309.5 282c-4.1-2-24.3-12-28.1-13.4-3.8-1.4-6.6-2-9.4 2-2.8 3.9-10.8 13.4-13.3 16.1-2.5 2.8-4.9 3-9 1.1-4.1-2-17.1-6.3-32.5-20.1-12-10.7-20.1-23.9-22.5-28-2.3-4.1-.2-6.3 1.7-8.2 1.7-1.7 3.9-4.5 5.8-6.7 1.9-2.2 2.5-3.9 3.8-6.6 1.2-2.8 .6-5.2-.3-7.3-.9-2-8.3-20-11.4-27.3-3-7.3-6.1-6.3-8.4-6.4-2.1-.1-4.6-.1-7.1-.1-2.5 0-6.6 .9-10 4.5-3.4 3.7-13.1 12.8-13.1 31.2s13.4 36.2 15.3 38.7c1.9 2.5 26.3 40.2 63.9 56.3 8.9 3.8 15.8 6.1 21.2 7.8 8.9 2.8 17 2.4 23.4 1.5 7.1-1 24.3-9.9 27.8-19.5 3.5-9.6 3.5-17.9 2.4-19.5-1.1-1.5-3.9-2.5-8.1-4.5z"/>
-      </svg>
-    </a>
-    """)
+# =================== THEME (assets estáticos versionados) ===================
+# El tema CSS y la barra social/WhatsApp viven en static/ como plantillas ({{IG_URL}}, ...).
+# Se renderizan una vez, se versionan por hash de contenido y el navegador los cachea
+# (Cache-Control immutable + ETag): cada sesión sólo lleva el <link>/<script> en la página.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSETS_PREFIX = "/assets"
+ASSETS_TIPOS = {
+    ".css": "text/css; charset=utf-8", ".js": "application/javascript; charset=utf-8",
+    ".webp": "image/webp", ".jpg": "image/jpeg",
+}
+
+# --- Fondo: se baja de Unsplash una sola vez (o se toma de static/fondo.jpg sin internet) y se
+# sirve desde /assets en variantes por ancho, WebP + JPEG. Si no hay imagen, queda el hot-link.
+FONDO_LOCAL = os.path.join(STATIC_DIR, "fondo.jpg")
+FONDO_CACHE = os.environ.get("FONDO_CACHE") or os.path.join(tempfile.gettempdir(), "dtc_fondo")
+FONDO_ANCHOS = (640, 1280, 1920)
+FONDO_CALIDAD = {"webp": 72, "jpg": 78}
+
+def _guardar(ruta, datos):
+    carpeta = os.path.dirname(ruta)
+    os.makedirs(carpeta, exist_ok=True)
+    # Temporal único por escritura: varios workers de gunicorn pueden generar el mismo archivo a la vez.
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _imagen_valida(datos, Image):
+    try:
+        Image.open(BytesIO(datos)).verify()
+        return True
+    except Exception:  # página de error HTML, descarga cortada, formato desconocido
+        return False
+
+def _fondo_original(Image):
+    """Bytes de la imagen de fondo: archivo empaquetado, caché de disco o descarga única.
+
+    Sólo se cachea lo que Pillow reconoce como imagen; None si no hay ninguna válida.
+    """
+    cache = os.path.join(FONDO_CACHE, "original.jpg")
+    for ruta in (FONDO_LOCAL, cache):
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as f:
+                datos = f.read()
+            if _imagen_valida(datos, Image):
+                return datos
+            print(f"⚠️ fondo: {ruta} no es una imagen válida, se ignora")
+    import urllib.request  # sólo la primera vez sin fondo empaquetado ni en caché
+    try:
+        with urllib.request.urlopen(UNSPLASH_MAIN, timeout=10) as r:
+            datos = r.read()
+    except OSError:
+        return None
+    if not _imagen_valida(datos, Image):
+        return None
+    _guardar(cache, datos)
+    return datos
+
+def variantes_fondo(descargar=True):
+    """{(ancho, 'webp'|'jpg'): bytes}; vacío si no hay imagen o falta Pillow.
+
+    Con descargar=False sólo usa variantes ya generadas en FONDO_CACHE (no baja ni recodifica nada).
+    """
+    variantes = {}
+    faltan = []
+    for ancho in FONDO_ANCHOS:
+        for ext in FONDO_CALIDAD:
+            ruta = os.path.join(FONDO_CACHE, f"fondo-{ancho}.{ext}")
+            if os.path.exists(ruta):
+                with open(ruta, "rb") as f:
+                    variantes[(ancho, ext)] = f.read()
+            else:
+                faltan.append((ancho, ext))
+    if not faltan:
+        return variantes
+    if not descargar:
+        return {}
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+    original = _fondo_original(Image)
+    if original is None:
+        return {}
+    try:
+        img = Image.open(BytesIO(original)).convert("RGB")
+    except Exception as e:
+        print(f"⚠️ fondo: no se pudo decodificar la imagen ({e}); se usa el link original")
+        return {}
+    for ancho, ext in faltan:
+        v = img if ancho >= img.width else img.resize((ancho, round(img.height * ancho / img.width)), Image.LANCZOS)
+        buff = BytesIO()
+        if ext == "webp":
+            v.save(buff, "WEBP", quality=FONDO_CALIDAD[ext], method=6)
+        else:
+            v.save(buff, "JPEG", quality=FONDO_CALIDAD[ext], optimize=True, progressive=True)
+        variantes[(ancho, ext)] = buff.getvalue()
+        _guardar(os.path.join(FONDO_CACHE, f"fondo-{ancho}.{ext}"), variantes[(ancho, ext)])
+    return variantes
+
+def _css_fondo(urls_fondo):
+    """Reglas image-set por ancho de viewport: el teléfono baja la variante chica en WebP."""
+    gradiente = "radial-gradient(ellipse at center, rgba(0,0,0,0.55) 0%, rgba(0,0,0,0.78) 100%)"
+    reglas = []
+    for i, ancho in enumerate(FONDO_ANCHOS):
+        image_set = (f"image-set(url('{urls_fondo[(ancho, 'webp')]}') type('image/webp'), "
+                     f"url('{urls_fondo[(ancho, 'jpg')]}') type('image/jpeg'))")
+        regla = f"html, body {{ background-image: {gradiente}, {image_set}; }}"
+        if i < len(FONDO_ANCHOS) - 1:
+            regla = f"@media (max-width: {ancho}px) {{ {regla} }}"
+        reglas.append(regla)
+    # De mayor a menor: la media query más angosta que aplique queda última y gana.
+    return "\n".join(reversed(reglas))
+
+def _versionar(contenido, nombre, datos):
+    digest = hashlib.sha256(datos).hexdigest()[:12]
+    base, ext = os.path.splitext(nombre)
+    versionado = f"{base}.{digest}{ext}"
+    contenido[versionado] = (datos, ASSETS_TIPOS[ext], f'"{digest}"')
+    return f"{ASSETS_PREFIX}/{versionado}"
+
+def _variables_assets(urls_fondo):
+    variables = {"IG_URL": IG_URL, "FB_URL": FB_URL, "WA_URL": WA_URL,
+                 "FONDO_URL": UNSPLASH_MAIN, "FONDO_VARIANTES": ""}
+    if urls_fondo:
+        variables["FONDO_URL"] = urls_fondo[(FONDO_ANCHOS[-1], "jpg")]
+        variables["FONDO_VARIANTES"] = _css_fondo(urls_fondo)
+    return variables
+
+@lru_cache(maxsize=2)
+def construir_assets(descargar_fondo=True):
+    """{'tema.css': url versionada, ...} y {nombre versionado: (bytes, content-type, etag)}."""
+    urls, contenido = {}, {}
+    urls_fondo = {
+        (ancho, ext): _versionar(contenido, f"fondo-{ancho}.{ext}", datos)
+        for (ancho, ext), datos in variantes_fondo(descargar_fondo).items()
+    }
+    variables = _variables_assets(urls_fondo)
+    for nombre in ("tema.css", "social.js"):
+        with open(os.path.join(STATIC_DIR, nombre), encoding="utf-8") as f:
+            texto = f.read()
+        for clave, valor in variables.items():
+            texto = texto.replace("{{" + clave + "}}", valor)
+        urls[nombre] = _versionar(contenido, nombre, texto.encode("utf-8"))
+    return urls, contenido
+
+# Todo lo publicado en /assets, de todas las versiones: una página abierta antes de que el fondo
+# quede listo sigue pidiendo su tema.css anterior.
+_assets = {}
+
+def publicar_assets(descargar_fondo=True):
+    """Sirve los assets en /assets y apunta el tema de PyWebIO (config) a la versión actual."""
+    from pywebio import config
+    urls, contenido = construir_assets(descargar_fondo)
+    _assets.update(contenido)
+    config(title=APP_TITLE, css_file=[urls["tema.css"]], js_file=[urls["social.js"]])
+    return urls
 
 # =================== LÓGICA DTC (igual a v4) ===================
 SUBS_DESC = {
@@ -167,237 +237,316 @@ SUBS_DESC = {
     "IDLE/VSS": "Ralentí, velocidad y cargas auxiliares.",
     "ECU/REF": "ECU, comunicación y referencias de 5 V.",
     "TRANSMISION": "Códigos TCM/transmisión (referencia — fuera del alcance motor).",
+    "CARROCERIA": "Carrocería (B): confort, airbag, iluminación y cierres.",
+    "CHASIS": "Chasis (C): ABS, control de estabilidad, dirección y suspensión.",
+    "RED": "Red de comunicación (U): CAN/LIN entre módulos.",
     "GENERAL": "Powertrain (general)."
 }
 
+# Pasos de diagnóstico por subsistema
+DIAG_PASOS = MappingProxyType({
+    "MAF": (
+        "Verificar conector, terminales y masa del sensor MAF.",
+        "Comprobar referencia 5 V (KOEO).",
+        "Medir señal MAF: 0.8–1.2 V en ralentí; sube hasta 4.0–4.5 V a 4.000 rpm.",
+        "Observar g/s en vivo: 2–7 g/s en ralentí (1.6–2.0 L), proporcional a cilindrada.",
+        "Inspeccionar fugas de admisión antes del MAF y filtro obstruido.",
+        "Limpiar con limpiador específico (no tocar hilo).",
+        "Probar continuidad hasta ECU si la señal es plana o errática."
+    ),
+    "MAP": (
+        "Revisar manguera de vacío (si aplica) y conector.",
+        "Confirmar 5 V de referencia (KOEO).",
+        "Medir señal MAP: KOEO ≈ 4.5–5.0 V; ralentí ≈ 0.9–1.5 V.",
+        "Comparar MAP–MAF: incoherencia sugiere fuga o sensor defectuoso.",
+        "Verificar vacío motor: 18–22 inHg aprox. en ralentí."
+    ),
+    "ECT/IAT": (
+        "Medir resistencia NTC: 20°C ≈ 2–3 kΩ; 80°C ≈ 300–500 Ω.",
+        "Confirmar 5 V y masa.",
+        "Comparar ECT con IAT en frío (similares, <3°C).",
+        "Revisar continuidad y conectores sulfatados si hay saltos en la lectura."
+    ),
+    "O2_HEATER": (
+        "Medir resistencia del calefactor: 8–14 Ω.",
+        "Verificar 12 V al calefactor (KOEO) y masa del circuito.",
+        "Controlar fusible del circuito HO2S Heater."
+    ),
+    "O2_SENSOR": (
+        "Observar sonda estrecha: 0.10–0.90 V oscilante en lazo cerrado.",
+        "Si fija pobre/rica, confirmar con test de propano y descartar fugas.",
+        "Chequear respuesta: forzar enriquecimiento y observar cambio rápido."
+    ),
+    "CAT": (
+        "Comparar O₂ upstream vs downstream (downstream debe oscilar menos).",
+        "Descartar misfire/mezcla rica previa antes de reemplazar catalizador.",
+        "Medir contrapresión de escape si hay sospecha de obstrucción."
+    ),
+    "EVAP": (
+        "Inspeccionar tapa de combustible (sellado correcto).",
+        "Realizar test de humo (líneas, canister, válvulas).",
+        "Revisar válvula de purga: trabada abierta → mezcla pobre inestable."
+    ),
+    "EGR": (
+        "Inspeccionar carbón en conductos y válvula EGR.",
+        "Comandar EGR con escáner: apertura excesiva casi apaga en ralentí.",
+        "Verificar que el sensor de posición EGR refleje el comando."
+    ),
+    "FUEL_PRESSURE": (
+        "Medir presión con manómetro: comparar con especificación (ej.: 3.0–3.5 bar multipunto).",
+        "Probar caudal de bomba y caída de voltaje en alimentación.",
+        "Controlar regulador de presión y retorno obstruido."
+    ),
+    "INJECTOR": (
+        "Comprobar pulso con lámpara noid.",
+        "Medir resistencia de bobina: 12–16 Ω (alta impedancia).",
+        "Realizar balance de inyectores (caída de presión similar)."
+    ),
+    "MISFIRE": (
+        "Identificar cilindro; intercambiar bobina/bujía para ver si el fallo se traslada.",
+        "Realizar prueba de compresión/fugas (variación ≤ ±10%).",
+        "Verificar mezcla: fugas de vacío, MAF/MAP y presión de combustible."
+    ),
+    "CKP/CMP": (
+        "Inspeccionar conector y presencia de limaduras en sensor CKP.",
+        "Medir: inductivo 500–1.500 Ω; Hall 5 V y señal cuadrada.",
+        "Ajustar distancia al reluctor y confirmar correlación CKP–CMP."
+    ),
+    "TPS/APP/ETC": (
+        "Verificar 5 V de referencia y masa.",
+        "Observar TPS: barrido 0.5 V → 4.5 V sin saltos.",
+        "Realizar aprendizaje/baseline del cuerpo electrónico; limpiar si hay suciedad."
+    ),
+    "IDLE/VSS": (
+        "Revisar IAC/ETC: pasos o % coherentes con velocidad de ralentí.",
+        "Detectar fugas de vacío (mangueras, PCV) si hay rpm elevadas.",
+        "Confirmar VSS coherente con velocidad real."
+    ),
+    "ECU/REF": (
+        "Comprobar líneas de 5 V comunes (un sensor en corto tumba el bus).",
+        "Verificar relé principal y masas de ECU (caída < 0.2 V).",
+        "Comprobar continuidad CAN y terminaciones."
+    )
+})
+
+DIAG_GENERICO = (
+    "Inspección visual y eléctrica básica.",
+    "Verificar 5 V, masa y continuidad.",
+    "Datos en vivo y correlaciones.",
+    "Pruebas de carga.",
+)
+
+# Las tablas son inmutables y compartidas entre sesiones: se devuelven tal cual,
+# y la nota extra se agrega en una tupla nueva (nunca sobre la compartida).
 def diag_plantilla(subsistema, extra=""):
-    base = {
-        "MAF": [
-            "Verificar conector, terminales y masa del sensor MAF.",
-            "Comprobar referencia 5 V (KOEO).",
-            "Medir señal MAF: 0.8–1.2 V en ralentí; sube hasta 4.0–4.5 V a 4.000 rpm.",
-            "Observar g/s en vivo: 2–7 g/s en ralentí (1.6–2.0 L), proporcional a cilindrada.",
-            "Inspeccionar fugas de admisión antes del MAF y filtro obstruido.",
-            "Limpiar con limpiador específico (no tocar hilo).",
-            "Probar continuidad hasta ECU si la señal es plana o errática."
-        ],
-        "MAP": [
-            "Revisar manguera de vacío (si aplica) y conector.",
-            "Confirmar 5 V de referencia (KOEO).",
-            "Medir señal MAP: KOEO ≈ 4.5–5.0 V; ralentí ≈ 0.9–1.5 V.",
-            "Comparar MAP–MAF: incoherencia sugiere fuga o sensor defectuoso.",
-            "Verificar vacío motor: 18–22 inHg aprox. en ralentí."
-        ],
-        "ECT/IAT": [
-            "Medir resistencia NTC: 20°C ≈ 2–3 kΩ; 80°C ≈ 300–500 Ω.",
-            "Confirmar 5 V y masa.",
-            "Comparar ECT con IAT en frío (similares, <3°C).",
-            "Revisar continuidad y conectores sulfatados si hay saltos en la lectura."
-        ],
-        "O2_HEATER": [
-            "Medir resistencia del calefactor: 8–14 Ω.",
-            "Verificar 12 V al calefactor (KOEO) y masa del circuito.",
-            "Controlar fusible del circuito HO2S Heater."
-        ],
-        "O2_SENSOR": [
-            "Observar sonda estrecha: 0.10–0.90 V oscilante en lazo cerrado.",
-            "Si fija pobre/rica, confirmar con test de propano y descartar fugas.",
-            "Chequear respuesta: forzar enriquecimiento y observar cambio rápido."
-        ],
-        "CAT": [
-            "Comparar O₂ upstream vs downstream (downstream debe oscilar menos).",
-            "Descartar misfire/mezcla rica previa antes de reemplazar catalizador.",
-            "Medir contrapresión de escape si hay sospecha de obstrucción."
-        ],
-        "EVAP": [
-            "Inspeccionar tapa de combustible (sellado correcto).",
-            "Realizar test de humo (líneas, canister, válvulas).",
-            "Revisar válvula de purga: trabada abierta → mezcla pobre inestable."
-        ],
-        "EGR": [
-            "Inspeccionar carbón en conductos y válvula EGR.",
-            "Comandar EGR con escáner: apertura excesiva casi apaga en ralentí.",
-            "Verificar que el sensor de posición EGR refleje el comando."
-        ],
-        "FUEL_PRESSURE": [
-            "Medir presión con manómetro: comparar con especificación (ej.: 3.0–3.5 bar multipunto).",
-            "Probar caudal de bomba y caída de voltaje en alimentación.",
-            "Controlar regulador de presión y retorno obstruido."
-        ],
-        "INJECTOR": [
-            "Comprobar pulso con lámpara noid.",
-            "Medir resistencia de bobina: 12–16 Ω (alta impedancia).",
-            "Realizar balance de inyectores (caída de presión similar)."
-        ],
-        "MISFIRE": [
-            "Identificar cilindro; intercambiar bobina/bujía para ver si el fallo se traslada.",
-            "Realizar prueba de compresión/fugas (variación ≤ ±10%).",
-            "Verificar mezcla: fugas de vacío, MAF/MAP y presión de combustible."
-        ],
-        "CKP/CMP": [
-            "Inspeccionar conector y presencia de limaduras en sensor CKP.",
-            "Medir: inductivo 500–1.500 Ω; Hall 5 V y señal cuadrada.",
-            "Ajustar distancia al reluctor y confirmar correlación CKP–CMP."
-        ],
-        "TPS/APP/ETC": [
-            "Verificar 5 V de referencia y masa.",
-            "Observar TPS: barrido 0.5 V → 4.5 V sin saltos.",
-            "Realizar aprendizaje/baseline del cuerpo electrónico; limpiar si hay suciedad."
-        ],
-        "IDLE/VSS": [
-            "Revisar IAC/ETC: pasos o % coherentes con velocidad de ralentí.",
-            "Detectar fugas de vacío (mangueras, PCV) si hay rpm elevadas.",
-            "Confirmar VSS coherente con velocidad real."
-        ],
-        "ECU/REF": [
-            "Comprobar líneas de 5 V comunes (un sensor en corto tumba el bus).",
-            "Verificar relé principal y masas de ECU (caída < 0.2 V).",
-            "Comprobar continuidad CAN y terminaciones."
-        ]
-    }
-    pasos = base.get(subsistema, ["Inspección visual y eléctrica básica.",
-                                  "Verificar 5 V, masa y continuidad.",
-                                  "Datos en vivo y correlaciones.",
-                                  "Pruebas de carga."])
+    pasos = DIAG_PASOS.get(subsistema, DIAG_GENERICO)
     if extra:
-        pasos.append(extra)
+        return pasos + (extra,)
     return pasos
 
 # Recomendaciones por subsistema
+RECOMENDACIONES = MappingProxyType({
+    "MAF": (
+        "Limpiar MAF con aerosol específico; **no** tocar el hilo.",
+        "Comparar g/s con cilindrada y RPM; **descartar** fugas antes del MAF.",
+        "Medir caída de voltaje en masa y 5 V; **reparar** falsos contactos."
+    ),
+    "MAP": (
+        "Controlar manguera y puertos de vacío; **reemplazar** si están cuarteados.",
+        "Comparar MAP con BARO al KOEO; **calibrar** si difiere mucho.",
+        "Testear con bomba de vacío (si aplica) y **observar** la curva de salida."
+    ),
+    "ECT/IAT": (
+        "Medir resistencia en frío y caliente; **sustituir** si queda fuera de tabla.",
+        "Comparar ECT vs IAT al arranque; **investigar** diferencias >3°C.",
+        "Controlar estado del termostato si la temperatura es errática."
+    ),
+    "O2_HEATER": (
+        "Verificar fusibles y **reparar** masa floja del calefactor.",
+        "Medir resistencia; **reemplazar** sonda si está abierta o en corto."
+    ),
+    "O2_SENSOR": (
+        "Forzar enriquecimiento y **confirmar** respuesta rápida.",
+        "Inspeccionar **fugas de escape** antes del sensor; **sellar** juntas.",
+        "Revisar masas de motor y **limpiar** puntos de unión."
+    ),
+    "CAT": (
+        "Analizar causas **upstream** (misfire/mezcla) antes de **reemplazar** el catalizador.",
+        "Medir contrapresión; **confirmar** obstrucción."
+    ),
+    "EVAP": (
+        "**Testear** estanqueidad con humo; **reparar** mangueras y válvulas.",
+        "Verificar tapa de combustible; **sustituir** si no sella."
+    ),
+    "EGR": (
+        "Descarbonizar conductos y **verificar** asiento de la válvula.",
+        "Usar el escáner para **comandar** y **evaluar** la respuesta del motor."
+    ),
+    "FUEL_PRESSURE": (
+        "Medir presión estática y dinámica; **comparar** con especificación.",
+        "Realizar prueba de caudal y **verificar** caída de voltaje en cables."
+    ),
+    "INJECTOR": (
+        "**Ultrasonido** y limpieza si hay desbalance.",
+        "Medir resistencia y **sustituir** el que difiera claramente."
+    ),
+    "MISFIRE": (
+        "**Intercambiar** componentes (bobina/bujía) para aislar el cilindro.",
+        "**Comprobar** compresión y fugas de cilindro."
+    ),
+    "CKP/CMP": (
+        "**Ajustar** luz al reluctor y **verificar** alineación de marcas.",
+        "**Observar** señal con osciloscopio si está disponible."
+    ),
+    "TPS/APP/ETC": (
+        "**Realizar** aprendizaje del cuerpo; **limpiar** mariposa si pega.",
+        "**Verificar** correlación APP1/APP2 y **reparar** cableado si hay salto."
+    ),
+    "IDLE/VSS": (
+        "**Sellar** fugas de vacío y **comprobar** PCV.",
+        "**Revisar** acumulación de carbón en cuerpo/IAC."
+    ),
+    "ECU/REF": (
+        "**Aislar** sensores en corto en la línea de 5 V desconectándolos uno a uno.",
+        "**Verificar** relé principal y **limpiar** masas de ECU."
+    ),
+    "GENERAL": (
+        "**Registrar** datos freeze frame y **comparar** con síntomas del cliente.",
+        "**Actualizar** software ECU si existe boletín aplicable."
+    ),
+    "TRANSMISION": (
+        "**Escanear** TCM y **corroborar** señales de par desde ECU motor.",
+    )
+})
+
 def recomendaciones(subsistema):
-    base = {
-        "MAF": [
-            "Limpiar MAF con aerosol específico; **no** tocar el hilo.",
-            "Comparar g/s con cilindrada y RPM; **descartar** fugas antes del MAF.",
-            "Medir caída de voltaje en masa y 5 V; **reparar** falsos contactos."
-        ],
-        "MAP": [
-            "Controlar manguera y puertos de vacío; **reemplazar** si están cuarteados.",
-            "Comparar MAP con BARO al KOEO; **calibrar** si difiere mucho.",
-            "Testear con bomba de vacío (si aplica) y **observar** la curva de salida."
-        ],
-        "ECT/IAT": [
-            "Medir resistencia en frío y caliente; **sustituir** si queda fuera de tabla.",
-            "Comparar ECT vs IAT al arranque; **investigar** diferencias >3°C.",
-            "Controlar estado del termostato si la temperatura es errática."
-        ],
-        "O2_HEATER": [
-            "Verificar fusibles y **reparar** masa floja del calefactor.",
-            "Medir resistencia; **reemplazar** sonda si está abierta o en corto."
-        ],
-        "O2_SENSOR": [
-            "Forzar enriquecimiento y **confirmar** respuesta rápida.",
-            "Inspeccionar **fugas de escape** antes del sensor; **sellar** juntas.",
-            "Revisar masas de motor y **limpiar** puntos de unión."
-        ],
-        "CAT": [
-            "Analizar causas **upstream** (misfire/mezcla) antes de **reemplazar** el catalizador.",
-            "Medir contrapresión; **confirmar** obstrucción."
-        ],
-        "EVAP": [
-            "**Testear** estanqueidad con humo; **reparar** mangueras y válvulas.",
-            "Verificar tapa de combustible; **sustituir** si no sella."
-        ],
-        "EGR": [
-            "Descarbonizar conductos y **verificar** asiento de la válvula.",
-            "Usar el escáner para **comandar** y **evaluar** la respuesta del motor."
-        ],
-        "FUEL_PRESSURE": [
-            "Medir presión estática y dinámica; **comparar** con especificación.",
-            "Realizar prueba de caudal y **verificar** caída de voltaje en cables."
-        ],
-        "INJECTOR": [
-            "**Ultrasonido** y limpieza si hay desbalance.",
-            "Medir resistencia y **sustituir** el que difiera claramente."
-        ],
-        "MISFIRE": [
-            "**Intercambiar** componentes (bobina/bujía) para aislar el cilindro.",
-            "**Comprobar** compresión y fugas de cilindro."
-        ],
-        "CKP/CMP": [
-            "**Ajustar** luz al reluctor y **verificar** alineación de marcas.",
-            "**Observar** señal con osciloscopio si está disponible."
-        ],
-        "TPS/APP/ETC": [
-            "**Realizar** aprendizaje del cuerpo; **limpiar** mariposa si pega.",
-            "**Verificar** correlación APP1/APP2 y **reparar** cableado si hay salto."
-        ],
-        "IDLE/VSS": [
-            "**Sellar** fugas de vacío y **comprobar** PCV.",
-            "**Revisar** acumulación de carbón en cuerpo/IAC."
-        ],
-        "ECU/REF": [
-            "**Aislar** sensores en corto en la línea de 5 V desconectándolos uno a uno.",
-            "**Verificar** relé principal y **limpiar** masas de ECU."
-        ],
-        "GENERAL": [
-            "**Registrar** datos freeze frame y **comparar** con síntomas del cliente.",
-            "**Actualizar** software ECU si existe boletín aplicable."
-        ],
-        "TRANSMISION": [
-            "**Escanear** TCM y **corroborar** señales de par desde ECU motor."
-        ]
-    }
-    return base.get(subsistema, base["GENERAL"])
+    return RECOMENDACIONES.get(subsistema, RECOMENDACIONES["GENERAL"])
+
+# Rangos DTC → (subsistema, descripción, es_motor).
+# Regla de resolución: el rango MÁS ANGOSTO gana (P0171 exacto pisa 170–179,
+# 325–329 knock pisa 301–339 misfire, 1–199 es sólo el respaldo genérico).
+# La tabla plana de 1000 slots se construye una vez al importar: O(1) por consulta.
+RANGOS_DTC = (
+    (  1,   4, "FUEL_PRESSURE", "Regulador de volumen de combustible — circuito/función", True),
+    ( 30,  39, "O2_HEATER", "Calentador de sensor O₂ — circuito (Bancos/Sensores)", True),
+    (100, 104, "MAF", "Sensor MAF — circuito/rango/funcionamiento", True),
+    (105, 109, "MAP", "Sensor MAP/Baro — circuito/rango/funcionamiento", True),
+    (110, 114, "ECT/IAT", "Sensor IAT — circuito/rango", True),
+    (115, 119, "ECT/IAT", "Sensor ECT — circuito/rango", True),
+    (120, 129, "TPS/APP/ETC", "Posición de acelerador — circuito/rango", True),
+    (130, 169, "O2_SENSOR", "Sensor de oxígeno — circuito/respuesta", True),
+    (170, 179, "FUEL_PRESSURE", "Trim de combustible fuera de rango (B1/B2)", True),
+    (171, 171, "MAF", "Mezcla pobre — Banco 1 (P0171)", True),
+    (172, 172, "MAF", "Mezcla rica — Banco 1 (P0172)", True),
+    (174, 174, "MAF", "Mezcla pobre — Banco 2 (P0174)", True),
+    (175, 175, "MAF", "Mezcla rica — Banco 2 (P0175)", True),
+    (180, 189, "FUEL_PRESSURE", "Temperatura de combustible / relacionados", True),
+    (190, 199, "FUEL_PRESSURE", "Sensor de presión de riel — circuito/rango", True),
+    (200, 219, "INJECTOR", "Circuito/control de inyectores", True),
+    (230, 239, "FUEL_PRESSURE", "Bomba de combustible — control/circuito", True),
+    (240, 249, "FUEL_PRESSURE", "EVAP — purga/ventilación — circuito", True),
+    (250, 259, "FUEL_PRESSURE", "Relación A/F — restricción/desempeño", True),
+    (260, 269, "TPS/APP/ETC", "Actuador aceleración (ETC) — desempeño", True),
+    (280, 289, "FUEL_PRESSURE", "Presión/boost — desempeño", True),
+    (290, 299, "FUEL_PRESSURE", "Under/overboost", True),
+    (300, 300, "MISFIRE", "Misfire aleatorio/múltiple (P0300)", True),
+    (301, 339, "MISFIRE", "Misfire cilindro específico", True),
+    (325, 329, "MISFIRE", "Sensor de detonación (Knock) — circuito", True),
+    (335, 339, "CKP/CMP", "Sensor CKP — circuito/posición", True),
+    (340, 349, "CKP/CMP", "Sensor CMP — circuito/posición", True),
+    (350, 369, "MISFIRE", "Bobinas/primario-secundario — circuito", True),
+    (400, 400, "EGR", "EGR — flujo insuficiente", True),
+    (401, 401, "EGR", "EGR — flujo insuficiente detectado", True),
+    (402, 402, "EGR", "EGR — flujo excesivo", True),
+    (410, 419, "EGR", "Aire secundario — circuito/desempeño", True),
+    (420, 420, "CAT", "Catalizador por debajo del umbral (B1)", True),
+    (430, 430, "CAT", "Catalizador por debajo del umbral (B2)", True),
+    (440, 459, "EVAP", "EVAP — fugas/ventilación/purga", True),
+    (460, 469, "FUEL_PRESSURE", "Sensor de nivel de combustible — circuito/alto/bajo", True),
+    (480, 489, "EGR", "Ventilador/sistema emisiones", True),
+    (500, 500, "IDLE/VSS", "VSS — circuito", True),
+    (505, 505, "IDLE/VSS", "IAC — funcionamiento", True),
+    (520, 529, "IDLE/VSS", "Presión de aceite motor / sensores", True),
+    (550, 559, "IDLE/VSS", "Dirección asistida / carga — impacto en ralentí", True),
+    (560, 569, "ECU/REF", "Sistema de voltaje — alto/bajo/irregular", True),
+    (600, 609, "ECU/REF", "Comunicación serie/Link — fallas", True),
+    (610, 619, "ECU/REF", "Control de vehículo — checksum/programación", True),
+    (620, 629, "ECU/REF", "Control actuadores (regulación/velocidad)", True),
+    (650, 650, "ECU/REF", "Control de lámpara MIL — circuito", True),
+    (680, 689, "ECU/REF", "Referencia 5 V — fallas (línea común)", True),
+    (700, 999, "TRANSMISION", "Código de transmisión/TCM (referencia de par motor)", False),
+    # Respaldos genéricos por centena
+    (  1, 199, "FUEL_PRESSURE", "Medición de aire/combustible — circuito/rango", True),
+    (200, 299, "INJECTOR", "Inyección/boost — circuito/desempeño", True),
+    (300, 399, "MISFIRE", "Encendido/sincronismo — fallas", True),
+    (400, 499, "EGR", "Emisiones (EGR/EVAP/CAT) — desempeño", True),
+    (500, 599, "IDLE/VSS", "Ralentí/velocidad/eléctrico — desempeño", True),
+    (600, 699, "ECU/REF", "ECU/Comunicación/Referencias — fallas", True),
+)
+INFO_GENERAL = ("GENERAL", "Powertrain (general)", True)
+
+# DTC que no están ni en la tabla interna ni en la base compilada (B1234, U0100 sin build, P1xxx de
+# fabricante): se informa la familia SAE y "sin datos", sin pasos de motor genéricos (es_motor=False).
+FAMILIAS_DTC = MappingProxyType({
+    "P": ("GENERAL", "Powertrain"),
+    "B": ("CARROCERIA", "Carrocería"),
+    "C": ("CHASIS", "Chasis"),
+    "U": ("RED", "Red de comunicación"),
+})
+
+def info_sin_datos(codigo):
+    subsistema, familia = FAMILIAS_DTC.get(codigo[:1], FAMILIAS_DTC["P"])
+    return (subsistema, f"{familia}: sin datos en la base para este código", False)
+
+def _construir_tabla(rangos):
+    # Se pinta del rango más ancho al más angosto; sort estable → a igual ancho gana el primero.
+    tabla = [INFO_GENERAL] * 1000
+    orden = sorted(range(len(rangos)), key=lambda i: rangos[i][1] - rangos[i][0], reverse=True)
+    for i in orden:
+        lo, hi, subsistema, desc, es_motor = rangos[i]
+        tabla[lo:hi + 1] = [(subsistema, desc, es_motor)] * (hi - lo + 1)
+    return tuple(tabla)
+
+_TABLA_DTC = _construir_tabla(RANGOS_DTC)
+
+def validar_rangos(rangos=RANGOS_DTC):
+    """Devuelve avisos de rangos que se solapan parcialmente o que no ganan ningún código."""
+    avisos = []
+    for i, (lo_a, hi_a, *_a) in enumerate(rangos):
+        for lo_b, hi_b, *_b in rangos[i + 1:]:
+            if lo_b > hi_a or lo_a > hi_b:
+                continue
+            anidado = (lo_a <= lo_b and hi_b <= hi_a) or (lo_b <= lo_a and hi_a <= hi_b)
+            if not anidado:
+                avisos.append(f"Solapamiento parcial: {lo_a}–{hi_a} y {lo_b}–{hi_b}")
+            elif (lo_a, hi_a) == (lo_b, hi_b):
+                avisos.append(f"Rango duplicado: {lo_a}–{hi_a}")
+    tabla = _construir_tabla(rangos)
+    for lo, hi, subsistema, desc, es_motor in rangos:
+        if all(tabla[n] != (subsistema, desc, es_motor) for n in range(lo, hi + 1)):
+            avisos.append(f"Rango inalcanzable: {lo}–{hi} ({desc})")
+    return avisos
 
 def info_codigo(num):
-    if   1 <= num <= 4:
-        return ("FUEL_PRESSURE", "Regulador de volumen de combustible — circuito/función", True)
-    if  30 <= num <= 39:
-        return ("O2_HEATER", "Calentador de sensor O₂ — circuito (Bancos/Sensores)", True)
-    if 100 <= num <= 104: return ("MAF", "Sensor MAF — circuito/rango/funcionamiento", True)
-    if 105 <= num <= 109: return ("MAP", "Sensor MAP/Baro — circuito/rango/funcionamiento", True)
-    if 110 <= num <= 114: return ("ECT/IAT", "Sensor IAT — circuito/rango", True)
-    if 115 <= num <= 119: return ("ECT/IAT", "Sensor ECT — circuito/rango", True)
-    if 120 <= num <= 129: return ("TPS/APP/ETC", "Posición de acelerador — circuito/rango", True)
-    if 130 <= num <= 169: return ("O2_SENSOR", "Sensor de oxígeno — circuito/respuesta", True)
-    if 170 <= num <= 179: return ("FUEL_PRESSURE", "Trim de combustible fuera de rango (B1/B2)", True)
-    if 171 == num:        return ("MAF", "Mezcla pobre — Banco 1 (P0171)", True)
-    if 172 == num:        return ("MAF", "Mezcla rica — Banco 1 (P0172)", True)
-    if 174 == num:        return ("MAF", "Mezcla pobre — Banco 2 (P0174)", True)
-    if 175 == num:        return ("MAF", "Mezcla rica — Banco 2 (P0175)", True)
-    if 180 <= num <= 189: return ("FUEL_PRESSURE", "Temperatura de combustible / relacionados", True)
-    if 190 <= num <= 199: return ("FUEL_PRESSURE", "Sensor de presión de riel — circuito/rango", True)
-    if 200 <= num <= 219: return ("INJECTOR", "Circuito/control de inyectores", True)
-    if 230 <= num <= 239: return ("FUEL_PRESSURE", "Bomba de combustible — control/circuito", True)
-    if 240 <= num <= 249: return ("FUEL_PRESSURE", "EVAP — purga/ventilación — circuito", True)
-    if 250 <= num <= 259: return ("FUEL_PRESSURE", "Relación A/F — restricción/desempeño", True)
-    if 260 <= num <= 269: return ("TPS/APP/ETC", "Actuador aceleración (ETC) — desempeño", True)
-    if 280 <= num <= 289: return ("FUEL_PRESSURE", "Presión/boost — desempeño", True)
-    if 290 <= num <= 299: return ("FUEL_PRESSURE", "Under/overboost", True)
-    if 300 == num:        return ("MISFIRE", "Misfire aleatorio/múltiple (P0300)", True)
-    if 301 <= num <= 339: return ("MISFIRE", "Misfire cilindro específico", True)
-    if 325 <= num <= 329: return ("MISFIRE", "Sensor de detonación (Knock) — circuito", True)
-    if 335 <= num <= 339: return ("CKP/CMP", "Sensor CKP — circuito/posición", True)
-    if 340 <= num <= 349: return ("CKP/CMP", "Sensor CMP — circuito/posición", True)
-    if 350 <= num <= 369: return ("MISFIRE", "Bobinas/primario-secundario — circuito", True)
-    if 400 == num:        return ("EGR", "EGR — flujo insuficiente", True)
-    if 401 == num:        return ("EGR", "EGR — flujo insuficiente detectado", True)
-    if 402 == num:        return ("EGR", "EGR — flujo excesivo", True)
-    if 410 <= num <= 419: return ("EGR", "Aire secundario — circuito/desempeño", True)
-    if 420 == num:        return ("CAT", "Catalizador por debajo del umbral (B1)", True)
-    if 430 == num:        return ("CAT", "Catalizador por debajo del umbral (B2)", True)
-    if 440 <= num <= 459: return ("EVAP", "EVAP — fugas/ventilación/purga", True)
-    if 460 <= num <= 469: return ("FUEL_PRESSURE", "Sensor de nivel de combustible — circuito/alto/bajo", True)
-    if 480 <= num <= 489: return ("EGR", "Ventilador/sistema emisiones", True)
-    if 500 == num:        return ("IDLE/VSS", "VSS — circuito", True)
-    if 505 == num:        return ("IDLE/VSS", "IAC — funcionamiento", True)
-    if 520 <= num <= 529: return ("IDLE/VSS", "Presión de aceite motor / sensores", True)
-    if 550 <= num <= 559: return ("IDLE/VSS", "Dirección asistida / carga — impacto en ralentí", True)
-    if 560 <= num <= 569: return ("ECU/REF", "Sistema de voltaje — alto/bajo/irregular", True)
-    if 600 <= num <= 609: return ("ECU/REF", "Comunicación serie/Link — fallas", True)
-    if 610 <= num <= 619: return ("ECU/REF", "Control de vehículo — checksum/programación", True)
-    if 620 <= num <= 629: return ("ECU/REF", "Control actuadores (regulación/velocidad)", True)
-    if 650 == num:        return ("ECU/REF", "Control de lámpara MIL — circuito", True)
-    if 680 <= num <= 689: return ("ECU/REF", "Referencia 5 V — fallas (línea común)", True)
-    if 700 <= num <= 999: return ("TRANSMISION", "Código de transmisión/TCM (referencia de par motor)", False)
-    if   1 <= num <= 199:  return ("FUEL_PRESSURE", "Medición de aire/combustible — circuito/rango", True)
-    elif 200 <= num <= 299:return ("INJECTOR", "Inyección/boost — circuito/desempeño", True)
-    elif 300 <= num <= 399:return ("MISFIRE", "Encendido/sincronismo — fallas", True)
-    elif 400 <= num <= 499:return ("EGR", "Emisiones (EGR/EVAP/CAT) — desempeño", True)
-    elif 500 <= num <= 599:return ("IDLE/VSS", "Ralentí/velocidad/eléctrico — desempeño", True)
-    elif 600 <= num <= 699:return ("ECU/REF", "ECU/Comunicación/Referencias — fallas", True)
-    return ("GENERAL", "Powertrain (general)", True)
+    if 0 <= num < 1000:
+        return _TABLA_DTC[num]
+    return INFO_GENERAL
+
+# Base compilada (kb/dtc_base.dtckb, ver kb_dtc.py): lo que la tabla interna no cubre (P1/P2/P3, B, C, U)
+# y sets de fabricante. Los P0001–P0999 genéricos salen siempre de RANGOS_DTC: el build no los acepta
+# en el CSV, así que editar la tabla alcanza. Si no se ejecutó el build, se usa sólo la tabla interna.
+KB = kb_dtc.abrir()
+
+def info_dtc(codigo, fabricante=""):
+    """Info de un DTC completo ('P0171', 'U0100', ...): set del fabricante o base compilada, si no la tabla interna."""
+    codigo = codigo.strip().upper()
+    if KB is not None and (fabricante or not kb_dtc.es_p0_interno(codigo)):
+        info = KB.info(codigo, fabricante)
+        if info is not None:
+            return info
+    if len(codigo) == 5 and codigo.startswith("P0") and codigo[2:].isdigit():
+        return info_codigo(int(codigo[2:]))
+    return info_sin_datos(codigo)
 
 def tips_especiales(num):
     tips = []
@@ -413,28 +562,80 @@ def tips_especiales(num):
         tips.append("Sincronismo: chequear correlación CKP–CMP (grados) y estado de correa/cadena.")
     return tips
 
+# Un único regex para las cuatro familias SAE (P/B/C/U), 2.º carácter 0–3 y 3 dígitos hex,
+# con sufijo opcional de tipo de falla ("P0171-00"). Lo que trae letra siempre cuenta, también
+# la forma corta "P171" = P0171. Los números sueltos ("171") se aceptan como P0xxx sólo si el
+# texto no trae ningún código con letra: así las líneas de freeze frame ("RPM 800", "ECT 90")
+# no generan códigos falsos.
+_DTC_RE = re.compile(
+    r"(?<![0-9A-Z])(?:([PCBU][0-3][0-9A-F]{3})|P(\d{1,4})|(\d{1,4}))(?:-[0-9A-F]{2})?(?![0-9A-Z])"
+)
+
+def parse_dtc(text):
+    """Texto libre → lista de DTC normalizados ('P0171', 'U0100', 'P2A00'), sin duplicados y en orden."""
+    codigos, sueltos = {}, {}
+    for m in _DTC_RE.finditer(text.upper()):
+        completo, corto, numero = m.groups()
+        if completo:
+            if completo != "P0000":  # P0000 = "sin falla"
+                codigos[completo] = None
+        elif corto:
+            n = int(corto)
+            if 1 <= n <= 999:
+                codigos[f"P{n:04d}"] = None
+        elif not codigos:
+            n = int(numero)
+            if 1 <= n <= 999:
+                sueltos[f"P{n:04d}"] = None
+    return list(codigos or sueltos)
+
 def parse_codes(text):
-    raw = re.split(r'[,\s;]+', text.strip().upper())
-    codes = []
-    for token in raw:
-        if not token:
-            continue
-        if token.startswith('P'):
-            token = token[1:]
-        if not token.isdigit():
-            continue
-        n = int(token)
-        if 1 <= n <= 999:
-            codes.append(n)
-    seen = set(); norm = []
-    for n in codes:
-        if n not in seen:
-            norm.append(n); seen.add(n)
-    return norm
-
-def render_entry(num):
-    codigo = f"P{num:04d}"
-    subsistema, desc, es_motor = info_codigo(num)
+    """Compatibilidad: sólo los P0001–P0999 de `parse_dtc`, como enteros."""
+    return [n for n in map(_codigo_p0, parse_dtc(text)) if n is not None]
+
+def normalizar_lote(raws):
+    """Normaliza una lista de entradas crudas en una llamada: un DTC (o None) por entrada.
+
+    Las entradas repetidas (habituales en volcados de escáner) se resuelven una sola vez.
+    """
+    memo = {}
+    salida = []
+    for raw in raws:
+        norm = memo.get(raw, memo)
+        if norm is memo:
+            codigos = parse_dtc(raw)
+            norm = memo[raw] = codigos[0] if codigos else None
+        salida.append(norm)
+    return salida
+
+def _codigo_p0(codigo):
+    """'P0171' → 171; None si no es un P0 numérico."""
+    if codigo.startswith("P0") and codigo[2:].isdigit():
+        return int(codigo[2:])
+    return None
+
+def render_entry(codigo):
+    """Tarjeta HTML de un DTC; acepta el código ('P0171') o el número P0 (171)."""
+    if not isinstance(codigo, str):
+        codigo = f"P{codigo:04d}"
+    return _render_tarjeta(codigo)
+
+# Caché de tarjetas HTML: la salida es determinística y hay sólo 999 códigos P0 válidos.
+RENDER_CACHE_MAX = 1024
+
+# Tarjetas sin pasos de motor: transmisión (referencia) o códigos sin datos en la base.
+NOTAS_FUERA_DE_MOTOR = MappingProxyType({
+    "TRANSMISION": ("Este código corresponde a <b>Transmisión (TCM)</b>.",
+                    "Revisar comunicación con TCM y estrategias de par motor."),
+})
+NOTAS_SIN_DATOS = (
+    "Este código <b>no está en la base</b>: no hay pasos de diagnóstico cargados.",
+    "Consultar la información de servicio del fabricante para el módulo que lo reporta.",
+)
+
+@lru_cache(maxsize=RENDER_CACHE_MAX)
+def _render_tarjeta(codigo):
+    subsistema, desc, es_motor = info_dtc(codigo)
 
     header = f"<div class='chip'><b>{codigo}</b> — {desc}</div>"
     sistema = f"<div class='chip'>Sistema: {SUBS_DESC.get(subsistema, subsistema)}</div>"
@@ -442,14 +643,12 @@ def render_entry(num):
     bloques = [f"<div class='card'>{header}<br/>{sistema}<div style='margin:6px 0'></div>"]
 
     if not es_motor:
-        cuerpo = ["<ul>",
-                  "<li>Este código corresponde a <b>Transmisión (TCM)</b>.</li>",
-                  "<li>Revisar comunicación con TCM y estrategias de par motor.</li>",
-                  "</ul>"]
-        bloques.append("".join(cuerpo))
+        notas = NOTAS_FUERA_DE_MOTOR.get(subsistema, NOTAS_SIN_DATOS)
+        bloques.append("<ul>" + "".join([f"<li>{n}</li>" for n in notas]) + "</ul>")
     else:
         pasos = diag_plantilla(subsistema)
-        extra = tips_especiales(num)
+        num = _codigo_p0(codigo)
+        extra = tips_especiales(num) if num is not None else []
         cuerpo = ["<b>Diagnóstico (nivel taller)</b><ol>"] + [f"<li>{p}</li>" for p in pasos] + ["</ol>"]
         if extra:
             cuerpo += ["<p><i>Notas:</i> " + " ".join(extra) + "</p>"]
@@ -461,62 +660,743 @@ def render_entry(num):
     bloques.append("</div>")
     return "".join(bloques)
 
+def render_cache_stats():
+    """Contadores de la caché de tarjetas: hits, misses, tamaño actual y máximo."""
+    info = _render_tarjeta.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max": info.maxsize}
+
+def precalentar_tarjetas():
+    for n in range(1, 1000):
+        render_entry(n)
+
+# =================== CORRELACIÓN DE CÓDIGOS ===================
+# tips_especiales() mira un código por vez; estas reglas miran el escaneo completo y resumen
+# la causa raíz probable arriba de las tarjetas y en el PDF (motor en correlacion_dtc.py).
+# Grupos: "P0171" · "P0420,P0430" (cualquiera) · "P0300-P0312" (rango) · cada(...) + minimo.
+_MISFIRE = "P0300-P0312"
+_POBRE = "P0171,P0174"
+_RICA = "P0172,P0175"
+_CATALIZADOR = "P0420,P0430"
+
+REGLAS_CORRELACION = (
+    Regla("misfire_catalizador", 95, (_MISFIRE, _CATALIZADOR),
+          "Misfire dañando el catalizador",
+          "Reparar primero el misfire: el combustible sin quemar recalienta el catalizador. "
+          "Cambiarlo sin resolver el encendido lo vuelve a dañar."),
+    Regla("sincronismo", 90, ("P0335-P0339", "P0340-P0349,P0365-P0369"),
+          "Falla de sincronismo CKP + CMP",
+          "Ambos sensores a la vez: revisar correa/cadena (salto de diente), rueda fónica, "
+          "alimentación y masa comunes antes que los sensores."),
+    Regla("correlacion_ckp_cmp", 85, ("P0016-P0019", "P0335-P0349"),
+          "Correlación cigüeñal–árbol de levas",
+          "Distribución fuera de punto o actuador VVT trabado: verificar marcas de distribución y tensor."),
+    Regla("ref_5v", 90, cada("P0641,P0651,P0697,P0107,P0108,P0122,P0123,P0222,P0223,P0532,P0533"),
+          "Referencia de 5 V compartida en corto",
+          "Varios sensores de 5 V fallan juntos: desconectar de a uno (TPS, MAP, presión A/C) "
+          "hasta que vuelva la referencia; revisar mazo rozado.",
+          minimo=2),
+    Regla("pobre_misfire", 85, (_POBRE, _MISFIRE),
+          "Misfire por mezcla pobre",
+          "La mezcla pobre provoca el misfire: buscar fuga de vacío, MAF sucio o baja presión de combustible "
+          "antes de tocar bujías o bobinas.",
+          reemplaza=("misfire_multiple",)),
+    Regla("rica_catalizador", 85, (_RICA, _CATALIZADOR),
+          "Mezcla rica recalentando el catalizador",
+          "Corregir la mezcla (presión alta, inyector goteando, MAF/ECT) antes de evaluar el catalizador."),
+    Regla("bancos_pobres", 80, ("P0171", "P0174"),
+          "Ambos bancos pobres: causa común",
+          "Si los dos bancos están pobres, no es un inyector ni una sonda: fuga de vacío post-MAF, "
+          "PCV, MAF subestimando o presión de combustible baja."),
+    Regla("bancos_ricos", 80, ("P0172", "P0175"),
+          "Ambos bancos ricos: causa común",
+          "Presión de combustible alta (regulador/retorno), purga EVAP o MAF/ECT con lectura errónea."),
+    Regla("maf_mezcla", 75, ("P0100-P0104", _POBRE + "," + _RICA),
+          "MAF alterando la mezcla",
+          "El MAF mide mal y la ECU corrige de más: limpiar/verificar MAF (g/s en ralentí) antes de tocar combustible."),
+    Regla("presion_pobre", 75, ("P0087,P0190-P0193", _POBRE),
+          "Presión de combustible baja → mezcla pobre",
+          "Medir presión y caudal: bomba, filtro o regulador antes que sensores de oxígeno."),
+    Regla("purga_pobre", 70, ("P0441,P0496", _POBRE),
+          "Purga EVAP trabada abierta",
+          "La válvula de purga abierta mete vapor y aire sin medir: probarla comandándola con el escáner."),
+    Regla("fuga_ralenti", 65, ("P0505-P0507", _POBRE),
+          "Fuga de vacío (ralentí alto + mezcla pobre)",
+          "Test de humo en admisión, PCV y servofreno."),
+    Regla("egr_misfire", 65, ("P0400-P0409", _MISFIRE),
+          "EGR trabada abierta causando misfire",
+          "Inspeccionar válvula y conductos EGR con carbón; misfire en ralentí que desaparece al acelerar."),
+    Regla("calefactores_o2", 60, cada("P0135,P0141,P0155,P0161"),
+          "Alimentación común de calefactores O2",
+          "Varios calefactores a la vez: fusible, relé o masa compartidos antes que las sondas.",
+          minimo=2),
+    Regla("inyectores_circuito", 70, cada("P0201-P0212"),
+          "Alimentación común de inyectores",
+          "Varios circuitos de inyector: relé/fusible de inyección o masa de ECU.",
+          minimo=2),
+    Regla("bobinas_circuito", 70, cada("P0351-P0362"),
+          "Alimentación común de bobinas",
+          "Varias bobinas a la vez: relé/fusible de encendido y masas del bloque.",
+          minimo=2),
+    Regla("misfire_multiple", 60, cada("P0301-P0312"),
+          "Misfire en varios cilindros",
+          "Causa común antes que bobina/bujía: mezcla, compresión, sincronismo o alimentación de bobinas.",
+          minimo=2),
+    Regla("catalizador_bancos", 55, ("P0420", "P0430"),
+          "Ambos catalizadores bajo eficiencia",
+          "Verificar sondas traseras y causa upstream (misfire/mezcla) común a los dos bancos."),
+    Regla("ect_termostato", 55, ("P0115-P0119", "P0125,P0128"),
+          "Sensor de temperatura antes que termostato",
+          "Con falla de circuito ECT, el código de termostato puede ser consecuencia: reparar el ECT primero."),
+    Regla("comunicacion_can", 90, cada("U0001,U0100,U0101,U0121,U0140,U0155"),
+          "Bus CAN caído o sin alimentación",
+          "Varios módulos sin comunicación: resistencias de terminación (≈60 Ω entre CAN-H y CAN-L), "
+          "alimentación/masa de módulos y conector del bus.",
+          minimo=2),
+)
+
+@lru_cache(maxsize=1)
+def motor_correlacion():
+    return MotorReglas(REGLAS_CORRELACION)
+
+@lru_cache(maxsize=256)
+def causas_probables(codigos):
+    """Tupla de códigos → ((id, prioridad, causa, detalle, códigos involucrados), ...) por prioridad."""
+    return motor_correlacion().evaluar(codigos)
+
+@lru_cache(maxsize=256)
+def render_causas(hallazgos):
+    """Resumen HTML de causa raíz (va arriba de las tarjetas); vacío si no hay combinaciones."""
+    if not hallazgos:
+        return ""
+    items = "".join(f"<li><b>{escape(causa)}</b> <i>({', '.join(codigos)})</i><br/>{escape(detalle)}</li>"
+                    for _, _, causa, detalle, codigos in hallazgos)
+    return f"<div class='card'><div class='chip'><b>🧭 Causa raíz probable</b></div><ol>{items}</ol></div>"
+
+# =================== BÚSQUEDA POR SÍNTOMA ===================
+# Índice invertido (busqueda_dtc.py) sobre lo mismo que muestra la tarjeta: código, descripción,
+# sistema, pasos de diagnóstico y notas. Se arma una vez (~1000 documentos) y cada consulta
+# resuelve en memoria, sin servicio externo: alcanza para buscar mientras se escribe.
+BUSQUEDA_LIMITE = 8
+
+PESO_CODIGO = 5.0
+PESO_DESCRIPCION = 3.0
+PESO_NOTAS = 2.0
+PESO_SISTEMA = 1.5
+PESO_PASOS = 1.0
+
+@lru_cache(maxsize=1)
+def indice_sintomas():
+    indice = IndiceTexto()
+    for n in range(1, 1000):
+        codigo = f"P{n:04d}"
+        subsistema, desc, es_motor = info_dtc(codigo)
+        campos = [
+            (f"{codigo} {n}", PESO_CODIGO),
+            (desc, PESO_DESCRIPCION),
+            (f"{subsistema} {SUBS_DESC.get(subsistema, '')}", PESO_SISTEMA),
+            (" ".join(tips_especiales(n)), PESO_NOTAS),
+        ]
+        if es_motor:
+            campos.append((" ".join(diag_plantilla(subsistema)), PESO_PASOS))
+        indice.agregar(codigo, campos, desc)
+    return indice.cerrar()
+
+def buscar_sintoma(consulta, limite=BUSQUEDA_LIMITE):
+    """Texto libre ('mezcla pobre', 'catalizdor', '5 V') → [(código, descripción, puntaje), ...]."""
+    return [(codigo, desc, puntaje) for codigo, puntaje, desc in indice_sintomas().buscar(consulta, limite)]
+
+# =================== MÉTRICAS (/metrics) ===================
+# Contadores e histogramas por proceso (ver metricas_dtc.py); /metrics los expone en formato
+# Prometheus, cada serie con la etiqueta worker="<pid>". Los medidores se calculan recién cuando alguien hace el scrape.
+M_SESIONES_INICIADAS = metricas.Contador("dtc_sesiones_iniciadas_total", "Sesiones PyWebIO abiertas")
+M_SESIONES_RECHAZADAS = metricas.Contador("dtc_sesiones_rechazadas_total", "Sesiones rechazadas por MAX_SESIONES")
+M_SESION_DURACION = metricas.Histograma("dtc_sesion_duracion_segundos", "Duración de las sesiones cerradas",
+                                        buckets=(10, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600))
+M_BUSQUEDAS = metricas.Contador("dtc_busquedas_total", "Búsquedas mostradas en la UI")
+M_CODIGOS_POR_BUSQUEDA = metricas.Histograma("dtc_codigos_por_busqueda", "Códigos por búsqueda",
+                                             buckets=(1, 2, 3, 5, 10, 20, 50, 100, 500))
+M_PARSE = metricas.Histograma("dtc_parse_segundos", "Parseo de los códigos ingresados (UI y API)")
+M_RENDER = metricas.Histograma("dtc_render_segundos", "Actualización de tarjetas por búsqueda (render + envío)")
+M_PDF = metricas.Histograma("dtc_pdf_segundos", "Armado de un PDF no cacheado (incluye espera en el pool)")
+M_PDF_BYTES = metricas.Histograma("dtc_pdf_bytes", "Tamaño de los PDF exportados",
+                                  buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6))
+M_PDF_RECHAZADOS = metricas.Contador("dtc_pdf_rechazados_total", "Export rechazados por cola de PDF llena")
+M_PDF_ERRORES = metricas.Contador("dtc_pdf_errores_total", "Export de PDF con error")
+_busquedas_minuto = metricas.Tasa(60)
+
+def _ratios_cache():
+    cachés = {"tarjetas": _render_tarjeta, "causas": causas_probables,
+              "pdf": generar_pdf, "ficha_api": ficha_dtc, "ficha_json": ficha_json}
+    if indice_sintomas.cache_info().currsize:
+        cachés["busqueda"] = indice_sintomas().buscar
+    ratios = {}
+    for nombre, fn in cachés.items():
+        info = fn.cache_info()
+        ratios[nombre] = info.hits / (info.hits + info.misses) if info.hits + info.misses else 0.0
+    return ratios
+
+metricas.Medidor("dtc_sesiones_activas", "Sesiones abiertas en este proceso", lambda: len(_sesiones))
+metricas.Medidor("dtc_busquedas_ultimo_minuto", "Búsquedas en los últimos 60 s", _busquedas_minuto.valor)
+metricas.Medidor("dtc_pdf_pendientes", "PDF en curso o en cola", lambda: pdf_pendientes())
+metricas.Medidor("dtc_cache_hit_ratio", "Aciertos / consultas de cada caché", _ratios_cache, etiqueta="cache")
+metricas.Medidor("dtc_rss_pico_bytes", "Pico de memoria residente del proceso",
+                 lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+# MEDIR_WS=1: registra los bytes que manda cada websocket por búsqueda (ráfaga de mensajes),
+# sin comprimir y con permessage-deflate (ver MedidorWS y WS_DEFLATE en arranque_dtc.py).
+MEDIR_WS = os.environ.get("MEDIR_WS", "").lower() in ("1", "true", "si", "sí")
+
+def _reportar_ws(ruta, mensajes, crudos, deflate):
+    from arranque_dtc import WS_DEFLATE
+    print(f"📦 ws {ruta}: {mensajes} mensajes, {crudos} B sin comprimir, ≈{deflate} B con deflate "
+          f"(x{crudos / max(deflate, 1):.1f}{'' if WS_DEFLATE else ', desactivado: WS_DEFLATE=0'})", flush=True)
+
+# Perfilador por muestreo: sólo se habilita si hay PERFIL_TOKEN (ver /debug/perfil).
+PERFIL_TOKEN = os.environ.get("PERFIL_TOKEN", "")
+PERFILADOR = metricas.Perfilador(intervalo_s=float(os.environ.get("PERFIL_INTERVALO_MS", "10")) / 1000)
+
 # =================== EXPORT A PDF (descarga inmediata) ===================
-def export_pdf_download(nums):
-    try:
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import mm
-        from reportlab.lib.enums import TA_LEFT
-        from reportlab.lib.pagesizes import A5
-        from reportlab.lib import colors
-        from io import BytesIO
+PDF_TITLE = "Informe de Diagnóstico DTC — Motor"
+PDF_CACHE_MAX = 64
 
-        buff = BytesIO()
+@lru_cache(maxsize=1)
+def _motor_pdf():
+    """Imports, estilos y decorado de página de ReportLab: se arman una vez por proceso."""
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.pagesizes import A5
+    from reportlab.lib import colors
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="H", parent=styles["Heading1"], fontSize=15.5, leading=17, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name="Sub", parent=styles["Normal"], fontSize=9.6, leading=12))
+    styles.add(ParagraphStyle(name="N", parent=styles["Normal"], fontSize=9.6, leading=12))
 
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name="H", parent=styles["Heading1"], fontSize=15.5, leading=17, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name="Sub", parent=styles["Normal"], fontSize=9.6, leading=12))
-        styles.add(ParagraphStyle(name="N", parent=styles["Normal"], fontSize=9.6, leading=12))
-
-        def on_page(canvas, doc):
-            canvas.saveState()
-            canvas.setFont("Helvetica", 8)
-            canvas.setFillColor(colors.grey)
-            canvas.drawString(10*mm, A5[1]-10*mm+2, BRAND[:110])
-            canvas.drawRightString(A5[0]-10*mm, 6*mm, f"Pág. {doc.page}")
-            canvas.restoreState()
-
-        doc = SimpleDocTemplate(
-            buff, pagesize=A5,
+    def on_page(canvas, doc):
+        canvas.saveState()
+        canvas.setFont("Helvetica", 8)
+        canvas.setFillColor(colors.grey)
+        canvas.drawString(10*mm, A5[1]-10*mm+2, BRAND[:110])
+        canvas.drawRightString(A5[0]-10*mm, 6*mm, f"Pág. {doc.page}")
+        canvas.restoreState()
+
+    def nuevo_doc(destino):
+        return SimpleDocTemplate(
+            destino, pagesize=A5,
             leftMargin=10*mm, rightMargin=10*mm, topMargin=10*mm, bottomMargin=10*mm,
-            title="Informe de Diagnóstico DTC — Motor"
+            title=PDF_TITLE
         )
-        story = []
-        fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
-        story.append(Paragraph("Informe de Diagnóstico DTC — Motor", styles["H"]))
-        story.append(Paragraph(f"{BRAND}", styles["Sub"]))
-        story.append(Paragraph(f"Fecha: {fecha}", styles["Sub"]))
-        story.append(Spacer(1, 4*mm))
 
-        for n in nums:
-            story.append(Paragraph(render_entry(n), styles["N"]))
-            story.append(Spacer(1, 2*mm))
+    return SimpleNamespace(Paragraph=Paragraph, Spacer=Spacer, mm=mm, styles=styles,
+                           on_page=on_page, nuevo_doc=nuevo_doc)
+
+def construir_pdf(codigos, fecha, destino=None, vehiculo=""):
+    """PDF para una tupla de códigos y una fecha 'YYYY-MM-DD'. Corre en los workers del pool.
+
+    Sin `destino` devuelve los bytes; con `destino` (ruta) escribe el archivo y devuelve la ruta,
+    así el PDF nunca viaja entero de vuelta al proceso web. `vehiculo` (patente/VIN) va al encabezado.
+    """
+    motor = _motor_pdf()
+    P, S, mm, styles = motor.Paragraph, motor.Spacer, motor.mm, motor.styles
+
+    if destino is None:
+        salida = BytesIO()
+    else:
+        # Temporal único, como en _guardar: el mismo PDF puede armarse a la vez en otra sesión o worker.
+        fd, salida = tempfile.mkstemp(dir=os.path.dirname(destino), prefix=".tmp-", suffix=".pdf")
+        os.close(fd)
+    doc = motor.nuevo_doc(salida)
+    story = [
+        P(PDF_TITLE, styles["H"]),
+        P(f"{BRAND}", styles["Sub"]),
+        P(f"Fecha: {fecha}", styles["Sub"]),
+    ]
+    if vehiculo:
+        story.append(P(f"Vehículo: {escape(vehiculo)}", styles["Sub"]))
+    story.append(S(1, 4*mm))
+    hallazgos = causas_probables(tuple(codigos))
+    if hallazgos:
+        story.append(P("<b>Causa raíz probable</b> (por combinación de códigos)", styles["N"]))
+        for i, (_, _, causa, detalle, involucrados) in enumerate(hallazgos, 1):
+            story.append(P(f"{i}. <b>{escape(causa)}</b> <i>({', '.join(involucrados)})</i> — {escape(detalle)}",
+                           styles["N"]))
+        story.append(S(1, 4*mm))
+    for codigo in codigos:
+        story.append(P(render_entry(codigo), styles["N"]))
+        story.append(S(1, 2*mm))
+
+    if destino is None:
+        doc.build(story, onFirstPage=motor.on_page, onLaterPages=motor.on_page)
+        return salida.getvalue()
+    try:
+        doc.build(story, onFirstPage=motor.on_page, onLaterPages=motor.on_page)
+        if not os.path.exists(destino):  # si otro armado ya lo publicó, es el mismo PDF
+            os.replace(salida, destino)
+    finally:
+        if os.path.exists(salida):
+            os.remove(salida)
+    return destino
+
+# --- Pool de procesos para PDF: el layout es CPU puro y no debe frenar a las otras sesiones ---
+# PDF_WORKERS=0 genera en el propio proceso (útil en desarrollo), con el mismo límite de cola.
+# Los procesos salen de un forkserver y no de un fork del worker web: éste tiene hilos (event loop,
+# threadpool, reaper, historial, perfilador) y un fork con un lock tomado puede colgar al hijo.
+# Cada proceso arma su motor PDF al arrancar (initializer).
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "2"))
+PDF_MAX_PENDIENTES = int(os.environ.get("PDF_MAX_PENDIENTES", "8"))
+PDF_TIMEOUT = float(os.environ.get("PDF_TIMEOUT", "120"))
+
+_pdf_pool = None
+_pdf_lock = threading.Lock()
+_pdf_pendientes = 0
+
+class ColaPDFLlena(RuntimeError):
+    """Se alcanzó PDF_MAX_PENDIENTES: el pedido se rechaza en vez de encolarse sin límite."""
+
+class PDFDemorado(TimeoutError):
+    """El PDF no estuvo en PDF_TIMEOUT segundos (el worker sigue armándolo y ocupa su lugar en la cola)."""
+
+def _pool():
+    global _pdf_pool
+    with _pdf_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=_motor_pdf,
+                                            mp_context=multiprocessing.get_context("forkserver"))
+        return _pdf_pool
+
+def arrancar_pool_pdf():
+    """Levanta los procesos del pool (import de la app + motor PDF) antes del primer export."""
+    if PDF_WORKERS > 0:
+        for futuro in [_pool().submit(os.getpid) for _ in range(PDF_WORKERS)]:
+            futuro.result()
+
+def cerrar_pool_pdf():
+    """Apaga el pool de PDF al cerrar el server: uvicorn sale re-lanzando la señal, sin atexit,
+    y los procesos del pool (hijos del forkserver) quedarían huérfanos."""
+    global _pdf_pool
+    with _pdf_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def pdf_pendientes():
+    return _pdf_pendientes
+
+def _ocupar_cupo():
+    global _pdf_pendientes
+    with _pdf_lock:
+        if _pdf_pendientes >= PDF_MAX_PENDIENTES:
+            raise ColaPDFLlena(f"{_pdf_pendientes} PDF en cola")
+        _pdf_pendientes += 1
+
+def _liberar_cupo(_futuro=None):
+    global _pdf_pendientes
+    with _pdf_lock:
+        _pdf_pendientes -= 1
 
-        doc.build(story, onFirstPage=on_page, onLaterPages=on_page)
+@contextmanager
+def _cupo_pdf():
+    """Ocupa un lugar de la cola de PDF mientras dura el bloque; ColaPDFLlena si no hay lugar."""
+    _ocupar_cupo()
+    try:
+        yield
+    finally:
+        _liberar_cupo()
+
+def _enviar_con_cupo(pool, fn, *args):
+    """pool.submit(fn, *args) ocupando un lugar de la cola hasta que el trabajo termine; ColaPDFLlena si no hay."""
+    _ocupar_cupo()
+    try:
+        futuro = pool.submit(fn, *args)
+    except BaseException:
+        _liberar_cupo()
+        raise
+    futuro.add_done_callback(_liberar_cupo)
+    return futuro
+
+def _en_pool(*args):
+    """Ejecuta construir_pdf(*args) en el pool; ColaPDFLlena si la cola está llena, PDFDemorado si vence PDF_TIMEOUT.
+
+    El lugar en la cola se libera cuando el worker termina, no cuando se deja de esperar: un PDF
+    vencido sigue ocupando su proceso, y contarlo evita pasar de PDF_MAX_PENDIENTES armados a la vez.
+    """
+    # M_PDF se observa acá y no en export_pdf_download: los aciertos de caché (LRU o archivo en el
+    # spool) no pasan por el pool y no deben bajar el p50/p95 del armado.
+    if PDF_WORKERS <= 0:
+        with _cupo_pdf(), cronometro(M_PDF):
+            return construir_pdf(*args)
+    with cronometro(M_PDF):
+        futuro = _enviar_con_cupo(_pool(), construir_pdf, *args)
+        try:
+            return futuro.result(timeout=PDF_TIMEOUT)
+        except FuturoVencido:
+            raise PDFDemorado(f"El PDF tardó más de {PDF_TIMEOUT:g} s") from None
+
+@lru_cache(maxsize=PDF_CACHE_MAX)
+def generar_pdf(codigos, fecha, vehiculo=""):
+    """PDF cacheado por (códigos ordenados, fecha, vehículo): el mismo combo del día no vuelve a `doc.build`.
+
+    Las excepciones (ColaPDFLlena incluida) no quedan en la caché.
+    """
+    return _en_pool(codigos, fecha, None, vehiculo)
+
+# --- Descarga por URL: todo PDF queda en PDF_SPOOL_DIR y se sirve en bloques desde /static ---
+# Nada del PDF viaja por el websocket ni queda en la sesión (put_file registraba un callback con
+# el PDF entero por cada export). Los informes grandes los escribe directo el worker del pool
+# (modo streaming); los chicos se arman en memoria, con la caché de generar_pdf, y se vuelcan al spool.
+PDF_SPOOL_DIR = os.environ.get("PDF_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "dtc_pdf")
+PDF_STREAM_MIN_CODIGOS = int(os.environ.get("PDF_STREAM_MIN_CODIGOS", "50"))
+PDF_SPOOL_TTL = float(os.environ.get("PDF_SPOOL_TTL", str(6 * 3600)))
+
+def _limpiar_spool():
+    limite = time.time() - PDF_SPOOL_TTL
+    for entrada in os.scandir(PDF_SPOOL_DIR):
+        try:
+            if entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+        except OSError:
+            pass
+
+def _nombre_spool(codigos, fecha, vehiculo=""):
+    clave = (fecha, codigos, vehiculo) if vehiculo else (fecha, codigos)
+    return hashlib.sha1(repr(clave).encode("utf-8")).hexdigest() + ".pdf"
+
+def generar_pdf_archivo(codigos, fecha, vehiculo=""):
+    """Nombre del PDF en PDF_SPOOL_DIR para (códigos, fecha, vehículo); el archivo existente hace de caché."""
+    nombre = _nombre_spool(codigos, fecha, vehiculo)
+    ruta = os.path.join(PDF_SPOOL_DIR, nombre)
+    if not os.path.exists(ruta):
+        os.makedirs(PDF_SPOOL_DIR, exist_ok=True)
+        _limpiar_spool()
+        _en_pool(codigos, fecha, ruta, vehiculo)
+    return nombre
+
+def publicar_pdf(codigos, fecha, vehiculo=""):
+    """Como generar_pdf_archivo, pero armando el PDF en memoria (generar_pdf) y volcándolo al spool."""
+    nombre = _nombre_spool(codigos, fecha, vehiculo)
+    ruta = os.path.join(PDF_SPOOL_DIR, nombre)
+    if not os.path.exists(ruta):
+        datos = generar_pdf(codigos, fecha, vehiculo)
+        os.makedirs(PDF_SPOOL_DIR, exist_ok=True)
+        _limpiar_spool()
+        _guardar(ruta, datos)
+    return nombre
 
-        fname = f"Informe_DTC_{datetime.now().strftime('%Y-%m-%d')}.pdf"
-        data = buff.getvalue()
-        buff.close()
+def clave_pdf(codigos, fecha=None):
+    """Clave de la caché de PDF: códigos ordenados (sin importar el orden de búsqueda) + fecha."""
+    return tuple(sorted(codigos)), fecha or datetime.now().strftime("%Y-%m-%d")
 
-        put_file(fname, data, label="⬇️ Descargar PDF")
+def export_pdf_download(codigos, vehiculo=""):
+    """Genera el PDF y ofrece la descarga en el scope "pdf".
+
+    Devuelve la fecha del informe (para el historial); None si no se pudo generar. El archivo del
+    spool se borra a los PDF_SPOOL_TTL: con códigos + fecha + vehículo se vuelve a armar igual.
+    """
+    with use_scope("pdf", clear=True):
+        put_loading(shape="border", color="light")
+        put_text("Generando PDF…")
+    try:
+        codigos, fecha = clave_pdf(codigos)
+        fname = _nombre_pdf_flota(vehiculo, fecha) if vehiculo else f"Informe_DTC_{fecha}.pdf"
+        generar = generar_pdf_archivo if len(codigos) >= PDF_STREAM_MIN_CODIGOS else publicar_pdf
+        nombre = generar(codigos, fecha, vehiculo)
+        M_PDF_BYTES.observar(os.path.getsize(os.path.join(PDF_SPOOL_DIR, nombre)))
+        with use_scope("pdf", clear=True):
+            put_html(f"<a class='btn btn-primary' href='/static/{nombre}' download='{fname}'>⬇️ Descargar PDF</a>")
+        return fecha
+    except ColaPDFLlena:
+        M_PDF_RECHAZADOS.inc()
+        clear("pdf")
+        toast("Hay muchos PDF generándose. Probá de nuevo en unos segundos.", color="warn")
+    except PDFDemorado:
+        M_PDF_ERRORES.inc()
+        clear("pdf")
+        toast("El PDF está tardando demasiado (servidor ocupado). Probá de nuevo en un rato.", color="error")
     except Exception as e:
-        popup("Exportar a PDF", [
-            put_markdown("No se pudo generar el PDF."),
-            put_text(str(e)),
-            put_markdown("Instalá reportlab así: `pip install reportlab`"),
-            put_button("Cerrar", onclick=close_popup)
-        ])
+        M_PDF_ERRORES.inc()
+        clear("pdf")
+        contenido = [put_markdown("No se pudo generar el PDF."), put_text(str(e))]
+        if isinstance(e, ImportError):
+            contenido.append(put_markdown("Instalá reportlab así: `pip install reportlab`"))
+        popup("Exportar a PDF", contenido + [put_button("Cerrar", onclick=close_popup)])
+
+# =================== INFORMES DE FLOTA (lote) ===================
+# CSV "vehiculo,codigos" (una fila por vehículo; los códigos en texto libre, en una o más columnas)
+# → un PDF por vehículo, generados en paralelo y empaquetados en un ZIP.
+FLOTA_WORKERS = int(os.environ.get("FLOTA_WORKERS", "0")) or os.cpu_count() or 1
+API_MAX_VEHICULOS = int(os.environ.get("API_MAX_VEHICULOS", "200"))
+# Token para /api/flota: un lote ocupa el pool de PDF de todos, así que sin token no se publica.
+FLOTA_TOKEN = os.environ.get("FLOTA_TOKEN", "")
+_ENCABEZADOS_FLOTA = ("vehiculo", "vehículo", "patente", "vin", "dominio")
+
+def leer_flota(texto):
+    """Filas CSV → [(vehiculo, códigos)], juntando filas repetidas del mismo vehículo."""
+    flota = {}
+    for i, fila in enumerate(csv.reader(texto.splitlines())):
+        if not fila or not fila[0].strip():
+            continue
+        if i == 0 and fila[0].strip().lower() in _ENCABEZADOS_FLOTA:
+            continue
+        codigos = flota.setdefault(fila[0].strip(), {})
+        codigos.update(dict.fromkeys(parse_dtc(" ".join(fila[1:]))))
+    return [(vehiculo, tuple(codigos)) for vehiculo, codigos in flota.items() if codigos]
+
+def _nombre_pdf_flota(vehiculo, fecha):
+    seguro = re.sub(r"[^0-9A-Za-z_-]+", "_", vehiculo).strip("_") or "vehiculo"
+    return f"Informe_DTC_{seguro}_{fecha}.pdf"
+
+def informe_flota(flota, fecha, destino, pool, en_vuelo=None, timeout=None):
+    """Genera un PDF por vehículo en `pool` y los escribe en el ZIP `destino` (ruta o archivo).
+
+    Devuelve {"informes", "errores", "segundos", "informes_s"}. Un vehículo que falla no corta el lote:
+    queda en "errores" [(vehiculo, mensaje)] y en ERRORES.txt dentro del ZIP. Los workers reutilizan
+    su motor ReportLab y las tarjetas cacheadas entre informes.
+
+    `en_vuelo` limita los trabajos enviados a la vez (sin límite: todo el lote). Si en `timeout`
+    segundos no termina ninguno, lo que falta se da por fallido en vez de esperar para siempre.
+    Si `pool.submit` da ColaPDFLlena sin trabajos propios en curso, el resto del lote también
+    falla (y si no se envió nada, la excepción sigue de largo).
+    """
+    inicio = time.perf_counter()
+    en_vuelo = en_vuelo or len(flota) or 1
+    pendientes, siguiente = {}, 0
+    usados = set()
+    errores = []
+    # Los PDF ya vienen comprimidos: ZIP_STORED evita recomprimir.
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED) as zf:
+        while siguiente < len(flota) or pendientes:
+            while siguiente < len(flota) and len(pendientes) < en_vuelo:
+                vehiculo, codigos = flota[siguiente]
+                try:
+                    futuro = pool.submit(construir_pdf, codigos, fecha, None, vehiculo)
+                except ColaPDFLlena as e:
+                    if pendientes:
+                        break  # se reintenta cuando termine uno propio
+                    if not siguiente:
+                        raise
+                    errores += [(v, f"ColaPDFLlena: {e}") for v, _ in flota[siguiente:]]
+                    siguiente = len(flota)
+                    break
+                pendientes[futuro] = vehiculo
+                siguiente += 1
+            if not pendientes:
+                break
+            listos, _ = wait(pendientes, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not listos:
+                errores += [(v, f"sin respuesta del pool en {timeout:g} s") for v in pendientes.values()]
+                errores += [(v, "no enviado: el pool no respondía") for v, _ in flota[siguiente:]]
+                break
+            for futuro in listos:
+                vehiculo = pendientes.pop(futuro)
+                try:
+                    datos = futuro.result()
+                except Exception as e:
+                    errores.append((vehiculo, f"{type(e).__name__}: {e}"))
+                    continue
+                nombre = _nombre_pdf_flota(vehiculo, fecha)
+                base, n = nombre, 1
+                while nombre in usados:
+                    n += 1
+                    nombre = base.replace(".pdf", f"_{n}.pdf")
+                usados.add(nombre)
+                zf.writestr(nombre, datos)
+        if errores:
+            zf.writestr("ERRORES.txt", "".join(f"{vehiculo}: {mensaje}\n" for vehiculo, mensaje in errores))
+    segundos = time.perf_counter() - inicio
+    informes = len(flota) - len(errores)
+    return {"informes": informes, "errores": errores, "segundos": segundos,
+            "informes_s": informes / segundos if segundos else 0.0}
+
+def informe_flota_cli(csv_path, zip_path, workers=FLOTA_WORKERS, fecha=None):
+    with open(csv_path, encoding="utf-8-sig") as f:
+        flota = leer_flota(f.read())
+    fecha = fecha or datetime.now().strftime("%Y-%m-%d")
+    precalentar_tarjetas()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        stats = informe_flota(flota, fecha, zip_path, pool)
+    print(f"{zip_path}: {stats['informes']} informes en {stats['segundos']:.2f} s "
+          f"({stats['informes_s']:.1f} informes/s, {workers} workers)")
+    for vehiculo, mensaje in stats["errores"]:
+        print(f"⚠️ {vehiculo}: {mensaje}")
+    return stats
+
+def informe_flota_api(texto):
+    """Para la API: (bytes del ZIP, stats) usando el pool compartido de PDF.
+
+    El lote no copa el pool: manda a lo sumo PDF_WORKERS informes a la vez y cada uno ocupa su
+    lugar en la cola de PDF, así un export de la UI espera a lo sumo esos y no el lote entero.
+    """
+    flota = leer_flota(texto)
+    fecha = datetime.now().strftime("%Y-%m-%d")
+    buff = BytesIO()
+    pool = _PoolConCupo(_pool() if PDF_WORKERS > 0 else _PoolLocal())
+    stats = informe_flota(flota, fecha, buff, pool, en_vuelo=max(PDF_WORKERS, 1), timeout=PDF_TIMEOUT)
+    return buff.getvalue(), stats
+
+class _PoolConCupo:
+    """Envoltorio de un pool: cada submit ocupa un lugar de la cola de PDF (ver _enviar_con_cupo)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def submit(self, fn, *args):
+        return _enviar_con_cupo(self.pool, fn, *args)
+
+class _PoolLocal:
+    """Ejecutor sin procesos (PDF_WORKERS=0): corre cada tarea al hacer submit."""
+
+    def submit(self, fn, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(fn(*args))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+# =================== SESIONES (tope, inactividad, memoria) ===================
+# Cada visitante es una sesión PyWebIO con su hilo de callbacks. Las tablets quedan abiertas
+# todo el día: se limita la cantidad, se cierran las inactivas y se mide cuánta memoria cuestan.
+MAX_SESIONES = int(os.environ.get("MAX_SESIONES", "200"))
+SESION_IDLE_S = float(os.environ.get("SESION_IDLE_S", "1800"))
+SESION_REVISION_S = float(os.environ.get("SESION_REVISION_S", "60"))
+
+class EstadoSesion:
+    __slots__ = ("sesion", "inicio", "ultima", "busquedas", "cerrando")
+
+    def __init__(self, sesion):
+        self.sesion = sesion
+        self.inicio = self.ultima = time.monotonic()
+        self.busquedas = 0
+        self.cerrando = None
+
+_sesiones = {}
+_sesiones_lock = threading.Lock()
+_reaper = None
+_rss_sin_sesiones = None
+
+def _rss_kib():
+    """RSS actual del proceso (KiB). Fuera de Linux, el pico (ru_maxrss)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _registrar_sesion():
+    """Da de alta la sesión actual; False si se alcanzó MAX_SESIONES."""
+    global _reaper
+    sesion = get_current_session()
+    with _sesiones_lock:
+        if len(_sesiones) >= MAX_SESIONES:
+            M_SESIONES_RECHAZADAS.inc()
+            return False
+        if not _sesiones:
+            global _rss_sin_sesiones
+            _rss_sin_sesiones = _rss_kib()
+        _sesiones[id(sesion)] = estado = EstadoSesion(sesion)
+        if _reaper is None:
+            _reaper = threading.Thread(target=_cerrar_inactivas, name="dtc-reaper", daemon=True)
+            _reaper.start()
+    M_SESIONES_INICIADAS.inc()
+    defer_call(lambda: _fin_sesion(estado))
+    return True
+
+def _fin_sesion(estado):
+    _sesiones.pop(id(estado.sesion), None)
+    M_SESION_DURACION.observar(time.monotonic() - estado.inicio)
+
+def _tocar():
+    """Marca actividad en la sesión actual (se llama desde cada callback de la UI)."""
+    estado = _sesiones.get(id(get_current_session()))
+    if estado is not None:
+        estado.ultima = time.monotonic()
+        estado.cerrando = None
+    return estado
+
+def _cerrar_inactivas():
+    while True:
+        time.sleep(SESION_REVISION_S)
+        ahora = time.monotonic()
+        with _sesiones_lock:
+            inactivas = [e for e in _sesiones.values() if ahora - e.ultima > SESION_IDLE_S]
+        for estado in inactivas:
+            try:
+                if estado.cerrando is None:
+                    # Primero se le pide al navegador que cierre (muestra el aviso de sesión cerrada).
+                    estado.cerrando = ahora
+                    estado.sesion.send_task_command({"command": "close_session"})
+                elif ahora - estado.cerrando > SESION_REVISION_S:
+                    # El navegador no respondió (tablet dormida): se libera del lado del servidor.
+                    estado.sesion.close(nonblock=True)
+                    _sesiones.pop(id(estado.sesion), None)
+            except Exception:
+                _sesiones.pop(id(estado.sesion), None)
+
+def sesiones_stats():
+    """Estado de las sesiones del worker, con memoria medida (no estimada por objeto).
+
+    Lo caro de una sesión PyWebIO son sus hilos (tarea principal y callbacks), sus colas de
+    mensajes y `session.save`; no se pueden pesar por separado, así que se mide el RSS del proceso
+    contra el que tenía al abrirse la primera de las sesiones actuales. Es aproximado: el
+    allocator no devuelve memoria enseguida y el precalentamiento puede sumar en paralelo.
+    """
+    with _sesiones_lock:
+        estados = list(_sesiones.values())
+        base = _rss_sin_sesiones
+    ahora = time.monotonic()
+    rss = _rss_kib()
+    return {
+        "activas": len(estados),
+        "max": MAX_SESIONES,
+        "idle_timeout_s": SESION_IDLE_S,
+        "inactivas": sum(1 for e in estados if ahora - e.ultima > SESION_IDLE_S),
+        "callbacks": sum(len(getattr(e.sesion, "callbacks", ())) for e in estados),
+        "hilos": threading.active_count(),
+        "rss_kib": rss,
+        "rss_sin_sesiones_kib": base if estados else rss,
+        "rss_por_sesion_kib": round((rss - base) / len(estados), 1) if estados and base else 0.0,
+        "rss_pico_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+# =================== HISTORIAL (SQLite) ===================
+# Búsquedas por vehículo (historial_dtc.py). Vacío (default) = desactivado: guarda patentes/VIN de
+# clientes y cualquiera que escriba una patente en la app ve sus búsquedas, así que se activa a
+# propósito (ej. HISTORIAL_DB=data/historial_dtc.sqlite3). En Render el disco del servicio es
+# efímero: para conservarlo entre deploys apuntar HISTORIAL_DB a un disco persistente.
+HISTORIAL_DB = os.environ.get("HISTORIAL_DB", "")
+HISTORIAL_MOSTRAR = 10
+# Token para /api/historial*: devuelven patentes/VIN con sus códigos, así que sin token no se publican.
+HISTORIAL_TOKEN = os.environ.get("HISTORIAL_TOKEN", "")
+
+_historial_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _abrir_historial():
+    h = historial_dtc.abrir(HISTORIAL_DB)
+    if h is not None:
+        atexit.register(h.vaciar, 2.0)
+    return h
+
+def historial():
+    """Historial abierto en el primer uso (None si está desactivado).
+
+    Con lock: lru_cache no serializa la primera llamada, y dos sesiones buscando a la vez en un
+    worker recién levantado abrirían dos Historial, cada uno con su hilo escritor.
+    """
+    with _historial_lock:
+        return _abrir_historial()
+
+def _historial_pendientes():
+    # No abre la base sólo por un scrape: si nadie la usó todavía, no hay nada en cola.
+    h = historial() if _abrir_historial.cache_info().currsize else None
+    return h.pendientes() if h is not None else 0
+
+metricas.Medidor("dtc_historial_pendientes", "Escrituras de historial en cola", _historial_pendientes)
+
+def _fecha_local(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
 
 # =================== APP ===================
 def home_header():
@@ -524,30 +1404,398 @@ def home_header():
     put_markdown("> Ingresá uno o varios códigos (ej.: `P0171, P0300`) y obtené el diagnóstico de taller.")
     put_markdown(f"_**{BRAND}**_")
 
+# Los botones de acción se registran una sola vez por sesión y leen los códigos de `local`:
+# antes cada búsqueda registraba closures nuevas que vivían hasta cerrar la pestaña.
+def _exportar_actual():
+    _tocar()
+    if local.codigos:
+        pdf = export_pdf_download(local.codigos, local.vehiculo or "")
+        if pdf and local.busqueda_ref and historial():
+            historial().registrar_pdf(local.busqueda_ref, pdf)
+
+def _nueva_busqueda():
+    _tocar()
+    clear("result")
+    clear("pdf")
+    clear("historial")
+    clear("causas")
+    local.codigos = ()
+    local.causas = ()
+    local.vehiculo = None
+    buscar_por_codigo()
+
+# Cada tarjeta vive en su propio scope (dtc_<código>) dentro de "result": una búsqueda sólo
+# manda las tarjetas que aparecen y borra las que ya no están, en vez de reenviar todo.
+def _scope_tarjeta(codigo):
+    return f"dtc_{codigo}"
+
+def _sincronizar_tarjetas(anteriores, codigos):
+    nuevos = set(codigos)
+    for codigo in anteriores:
+        if codigo not in nuevos:
+            remove(_scope_tarjeta(codigo))
+    mostrados = [c for c in anteriores if c in nuevos]
+    for i, codigo in enumerate(codigos):
+        if i < len(mostrados) and mostrados[i] == codigo:
+            continue
+        if codigo in mostrados:  # cambió de lugar: se reubica
+            remove(_scope_tarjeta(codigo))
+            mostrados.remove(codigo)
+        put_scope(_scope_tarjeta(codigo), [put_html(render_entry(codigo))], scope="result", position=i)
+        mostrados.insert(i, codigo)
+
+def _preparar_resultados():
+    """Scopes de historial/causas/tarjetas y botones de acción, una sola vez por sesión."""
+    if not local.acciones:
+        put_scope("historial")
+        put_scope("causas")
+        put_scope("result")
+        put_scope("acciones", [put_row([
+            put_button("📄 Exportar PDF (descargar)", onclick=_exportar_actual),
+            put_button("🔁 Nueva búsqueda", onclick=_nueva_busqueda)
+        ], size="auto")])
+        local.acciones = True
+
+def _mostrar_codigos(codigos, estado):
+    anteriores, local.codigos = local.codigos or (), tuple(codigos)
+    if estado is not None:
+        estado.busquedas += 1
+    M_BUSQUEDAS.inc()
+    _busquedas_minuto.marcar()
+    M_CODIGOS_POR_BUSQUEDA.observar(len(codigos))
+    if historial():
+        local.busqueda_ref = historial().registrar(local.codigos, local.vehiculo or "")
+    _preparar_resultados()
+    clear("pdf")
+    with cronometro(M_RENDER):
+        hallazgos = causas_probables(local.codigos)
+        if hallazgos != (local.causas or ()):
+            local.causas = hallazgos
+            with use_scope("causas", clear=True):
+                if hallazgos:
+                    put_html(render_causas(hallazgos))
+        _sincronizar_tarjetas(anteriores, local.codigos)
+
+def _mostrar_historial(vehiculo):
+    """Búsquedas anteriores del vehículo (consulta indexada por patente/VIN)."""
+    filas = historial().historial_vehiculo(vehiculo, HISTORIAL_MOSTRAR) if historial() else []
+    with use_scope("historial", clear=True):
+        if filas:
+            put_markdown(f"**🗂️ Historial de {historial_dtc.normalizar_vehiculo(vehiculo)}**")
+            put_table([[_fecha_local(ts), " ".join(codigos), "📄" if pdf else ""] for ts, codigos, pdf in filas],
+                      header=["Fecha", "Códigos", "PDF"])
+
 def buscar_por_codigo():
-    data = input_group("Buscar por código DTC", [
-        input(label="Códigos (coma o espacio):", name="codes", type=TEXT, placeholder="P0171 P0300 P0420"),
-    ])
-    nums = parse_codes(data["codes"] or "")
-    if not nums:
+    estado = _tocar()
+    campos = [
+        input(label="Códigos (coma o espacio):", name="codes", type=TEXT, placeholder="P0171 P0300 P0420",
+              value=" ".join(local.codigos or ())),
+    ]
+    if HISTORIAL_DB:
+        campos.append(input(label="Patente / VIN (opcional, para el historial):", name="vehiculo", type=TEXT,
+                            placeholder="AB123CD", value=local.vehiculo or ""))
+    data = input_group("Buscar por código DTC", campos)
+    with cronometro(M_PARSE):
+        codigos = parse_dtc(data["codes"] or "")
+    if not codigos:
         toast("No se reconocieron códigos. Probá con P0171, P0300, etc.", color="warn")
         return
-    with use_scope("result", clear=True):
-        rows = [[put_html(render_entry(n))] for n in nums]
-        put_table(rows)
-        put_row([
-            put_button("📄 Exportar PDF (descargar)", onclick=lambda: export_pdf_download(nums)),
-            put_button("🔁 Nueva búsqueda", onclick=lambda: run_js("location.reload()"))
-        ], size="auto")
+    vehiculo = (data.get("vehiculo") or "").strip()
+    cambio = historial_dtc.normalizar_vehiculo(vehiculo) != historial_dtc.normalizar_vehiculo(local.vehiculo)
+    local.vehiculo = vehiculo
+    if cambio:
+        _preparar_resultados()
+        if vehiculo:
+            _mostrar_historial(vehiculo)
+        else:
+            clear("historial")
+    _mostrar_codigos(codigos, estado)
+
+# Búsqueda mientras se escribe: un único callback de pin por sesión actualiza la lista de
+# sugerencias; el botón (también único) muestra las tarjetas de lo que está en pantalla.
+def _sugerir(consulta):
+    _tocar()
+    resultados = buscar_sintoma(consulta or "")
+    local.sugeridos = tuple(codigo for codigo, _, _ in resultados)
+    with use_scope("sugerencias", clear=True):
+        if resultados:
+            put_table([[codigo, desc] for codigo, desc, _ in resultados], header=["Código", "Descripción"])
+        elif (consulta or "").strip():
+            put_text("Sin coincidencias. Probá con otra palabra (ej.: mezcla, encendido, catalizador).")
+
+def _ver_sugeridos():
+    estado = _tocar()
+    if local.sugeridos:
+        _mostrar_codigos(local.sugeridos, estado)
+
+def buscar_por_sintoma():
+    _tocar()
+    if local.sintoma:
+        return
+    local.sintoma = True
+    put_scope("sintoma", [
+        put_input("sintoma", label="Síntoma o palabra clave:", placeholder="mezcla pobre, misfire, catalizador, 5 V"),
+        put_scope("sugerencias"),
+        put_button("🩺 Ver diagnóstico de estos códigos", onclick=_ver_sugeridos, small=True),
+    ])
+    pin_on_change("sintoma", onchange=_sugerir)
 
 def app():
-    setup_theme_and_social()
     set_env(title=APP_TITLE)
+    if not _registrar_sesion():
+        put_markdown(f"# 🧰 {APP_TITLE}")
+        put_markdown("⚠️ **Hay muchas personas usando el asistente en este momento.** Probá de nuevo en unos minutos.")
+        return
     home_header()
     put_row([
-        put_button("🔎 Buscar por código", onclick=buscar_por_codigo)
+        put_button("🔎 Buscar por código", onclick=buscar_por_codigo),
+        put_button("🩺 Buscar por síntoma", onclick=buscar_por_sintoma),
     ], size="auto")
     put_text("© 2025 César Mastrocola — Check Engine Escaneo Vehicular")
 
+# =================== API JSON (sin websocket) ===================
+# GET /api/dtc?codes=P0171,P0300  ·  POST /api/dtc {"codes": ["P0171", ...]} o {"codes": "texto libre"}
+# Respuesta determinística por conjunto de códigos → se sirve con ETag. Se cachea el JSON de cada
+# código (≤ 1 KB, acotado por RENDER_CACHE_MAX) y el cuerpo se arma por pedido: cachear cuerpos
+# enteros por tupla ordenada dejaba a un cliente fijar cientos de MB mandando permutaciones.
+API_MAX_CODIGOS = int(os.environ.get("API_MAX_CODIGOS", "500"))
+API_CACHE_CONTROL = "public, max-age=86400"
+
+@lru_cache(maxsize=RENDER_CACHE_MAX)
+def ficha_dtc(codigo):
+    """Datos estructurados de un DTC (lo mismo que muestra la tarjeta, sin HTML)."""
+    subsistema, desc, es_motor = info_dtc(codigo)
+    num = _codigo_p0(codigo)
+    return MappingProxyType({
+        "codigo": codigo,
+        "descripcion": desc,
+        "subsistema": subsistema,
+        "sistema": SUBS_DESC.get(subsistema, subsistema),
+        "es_motor": es_motor,
+        "diagnostico": diag_plantilla(subsistema) if es_motor else (),
+        "notas": tuple(tips_especiales(num)) if es_motor and num is not None else (),
+        "recomendaciones": recomendaciones(subsistema) if es_motor or subsistema in NOTAS_FUERA_DE_MOTOR else (),
+    })
+
+def _json(valor):
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+
+@lru_cache(maxsize=RENDER_CACHE_MAX)
+def ficha_json(codigo):
+    return _json(dict(ficha_dtc(codigo)))
+
+def respuesta_api(codigos):
+    """(cuerpo JSON en bytes, ETag) para una tupla de códigos normalizados."""
+    causas = [{"causa": causa, "detalle": detalle, "prioridad": prioridad, "codigos": involucrados}
+              for _, prioridad, causa, detalle, involucrados in causas_probables(codigos)]
+    cuerpo = ('{"codigos":[' + ",".join([ficha_json(c) for c in codigos]) + '],"causas":'
+              + _json(causas) + "}").encode("utf-8")
+    return cuerpo, '"' + hashlib.sha1(cuerpo).hexdigest() + '"'
+
+def codigos_api(valor):
+    """Lista de textos o texto libre → tupla de DTC normalizados (mismo parser que la UI)."""
+    if isinstance(valor, (list, tuple)):
+        valor = " ".join(valor)
+    with cronometro(M_PARSE):
+        return tuple(parse_dtc(valor or ""))
+
+# =================== SERVIDOR (ASGI) ===================
+# Producción: gunicorn + workers uvicorn (ver gunicorn.conf.py / Procfile) sobre arranque_dtc.app,
+# que abre el puerto antes de importar este módulo. crear_asgi() arma sólo lo imprescindible para
+# servir la primera página; lo caro de calentar queda para precalentar(), en segundo plano.
+DEBUG = os.environ.get("DEBUG", "").lower() in ("1", "true", "si", "sí")
+
+def precalentar():
+    """Tarjetas, índice de búsqueda, reglas de correlación, motor y pool de PDF y fondo. Devuelve {fase: segundos}.
+
+    El motor PDF se arma en el proceso web (PDF_WORKERS=0, API) y los procesos del pool se levantan
+    acá, cada uno con el suyo: el primer export no paga el import de ReportLab. El fondo (descarga
+    y variantes, la primera vez) va al final: hasta entonces el tema usa el link de Unsplash.
+    """
+    fases = {}
+    for nombre, fn in (("tarjetas", precalentar_tarjetas), ("indice", indice_sintomas),
+                       ("reglas", motor_correlacion), ("pdf", _motor_pdf), ("pool", arrancar_pool_pdf),
+                       ("fondo", publicar_assets)):
+        t = time.perf_counter()
+        fn()
+        fases[nombre] = time.perf_counter() - t
+    return fases
+
+def crear_asgi(precalentar_en_fondo=True):
+    """App Starlette: PyWebIO (websocket) + descargas de PDF en streaming bajo /static."""
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse, PlainTextResponse, Response
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+    from pywebio.platform.fastapi import webio_routes
+
+    os.makedirs(PDF_SPOOL_DIR, exist_ok=True)
+
+    # Sólo variantes de fondo ya generadas: bajar y recodificar queda para precalentar().
+    publicar_assets(descargar_fondo=False)
+
+    def cacheable(request, datos, tipo, etag, cache_control):
+        cabeceras = {"Cache-Control": cache_control, "ETag": etag}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=cabeceras)
+        return Response(datos, media_type=tipo, headers=cabeceras)
+
+    def _entero(request, nombre, defecto, maximo):
+        valor = request.query_params.get(nombre, "")
+        return min(int(valor), maximo) if valor.isdigit() and int(valor) > 0 else defecto
+
+    async def servir_asset(request):
+        asset = _assets.get(request.path_params["nombre"])
+        if asset is None:
+            return Response(status_code=404)
+        datos, tipo, etag = asset
+        return cacheable(request, datos, tipo, etag, "public, max-age=31536000, immutable")
+
+    async def api_dtc(request):
+        if request.method == "POST":
+            try:
+                pedido = await request.json()
+            except ValueError:
+                return JSONResponse({"error": "JSON inválido"}, status_code=400)
+            valor = pedido.get("codes") if isinstance(pedido, dict) else pedido
+            # Números sueltos tampoco: 171 no dice si es P0171 o un dato de freeze frame; "P0171" / "171" sí.
+            if valor is not None and not (isinstance(valor, str) or
+                                          isinstance(valor, list) and all(isinstance(v, str) for v in valor)):
+                return JSONResponse({"error": "codes debe ser texto o una lista de códigos en texto"}, status_code=400)
+            codigos = codigos_api(valor)
+        else:
+            codigos = codigos_api(request.query_params.get("codes", ""))
+        if not codigos:
+            return JSONResponse({"error": "No se reconocieron códigos (ej.: P0171,P0300)"}, status_code=400)
+        if len(codigos) > API_MAX_CODIGOS:
+            return JSONResponse({"error": f"Máximo {API_MAX_CODIGOS} códigos por consulta"}, status_code=413)
+        cuerpo, etag = respuesta_api(codigos)
+        return cacheable(request, cuerpo, "application/json; charset=utf-8", etag, API_CACHE_CONTROL)
+
+    async def api_buscar(request):
+        consulta = request.query_params.get("q", "").strip()
+        if not consulta:
+            return JSONResponse({"error": "Falta el parámetro q (ej.: ?q=mezcla pobre)"}, status_code=400)
+        limite = _entero(request, "limite", BUSQUEDA_LIMITE, 50)
+        resultados = [{"codigo": c, "descripcion": d, "puntaje": round(p, 2)}
+                      for c, d, p in buscar_sintoma(consulta, limite)]
+        return JSONResponse({"consulta": consulta, "resultados": resultados},
+                            headers={"Cache-Control": API_CACHE_CONTROL})
+
+    async def api_sesiones(request):
+        return JSONResponse(sesiones_stats())
+
+    async def api_historial(request):
+        if request.query_params.get("token") != HISTORIAL_TOKEN:
+            return Response(status_code=403)
+        h = historial()
+        if h is None:
+            return JSONResponse({"error": "Historial desactivado (HISTORIAL_DB vacío)"}, status_code=404)
+        limite = _entero(request, "limite", 50, 500)
+        vehiculo = request.query_params.get("vehiculo", "")
+        codigo = (codigos_api(request.query_params.get("codigo", "")) or ("",))[0]
+        if historial_dtc.normalizar_vehiculo(vehiculo):
+            filas = await run_in_threadpool(h.historial_vehiculo, vehiculo, limite)
+            return JSONResponse({"vehiculo": historial_dtc.normalizar_vehiculo(vehiculo), "busquedas": [
+                {"fecha": _fecha_local(ts), "codigos": list(codigos), "pdf": pdf} for ts, codigos, pdf in filas]})
+        if codigo:
+            filas = await run_in_threadpool(h.vehiculos_con_codigo, codigo, limite)
+            return JSONResponse({"codigo": codigo, "vehiculos": [
+                {"vehiculo": v, "veces": n, "ultima": _fecha_local(ts)} for v, n, ts in filas]})
+        return JSONResponse({"error": "Indicá ?vehiculo=AB123CD o ?codigo=P0171"}, status_code=400)
+
+    async def api_frecuentes(request):
+        if request.query_params.get("token") != HISTORIAL_TOKEN:
+            return Response(status_code=403)
+        h = historial()
+        if h is None:
+            return JSONResponse({"error": "Historial desactivado (HISTORIAL_DB vacío)"}, status_code=404)
+        limite = _entero(request, "limite", 20, 500)
+        dias = _entero(request, "dias", 0, 3650)
+        desde = time.time() - dias * 86400 if dias else None
+        filas = await run_in_threadpool(h.codigos_frecuentes, limite, desde)
+        return JSONResponse({"dias": dias or None, "codigos": [
+            {"codigo": c, "busquedas": n, "vehiculos": v, "descripcion": info_dtc(c)[1]} for c, n, v in filas]})
+
+    async def servir_metricas(request):
+        return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    async def perfil(request):
+        if request.query_params.get("token") != PERFIL_TOKEN:
+            return Response(status_code=403)
+        accion = request.query_params.get("accion")
+        if accion == "iniciar":
+            PERFILADOR.iniciar()
+        elif accion == "detener":
+            await run_in_threadpool(PERFILADOR.detener)
+        return PlainTextResponse(PERFILADOR.plegado(), headers={
+            "X-Perfil-Activo": "1" if PERFILADOR.activo else "0",
+            "X-Perfil-Muestras": str(PERFILADOR.muestras),
+        })
+
+    async def api_flota(request):
+        if request.query_params.get("token") != FLOTA_TOKEN:
+            return Response(status_code=403)
+        texto = (await request.body()).decode("utf-8-sig", errors="replace")
+        n = len(leer_flota(texto))
+        if not n:
+            return JSONResponse({"error": "CSV sin filas vehiculo,codigos reconocibles"}, status_code=400)
+        if n > API_MAX_VEHICULOS:
+            return JSONResponse({"error": f"Máximo {API_MAX_VEHICULOS} vehículos por lote"}, status_code=413)
+        try:
+            datos, stats = await run_in_threadpool(informe_flota_api, texto)
+        except ColaPDFLlena:
+            return JSONResponse({"error": "Servidor ocupado generando PDF; reintentá en unos segundos"},
+                                status_code=503, headers={"Retry-After": "10"})
+        if not stats["informes"]:
+            return JSONResponse({"error": "No se pudo generar ningún informe", "errores": [
+                {"vehiculo": v, "error": e} for v, e in stats["errores"]]}, status_code=500)
+        fecha = datetime.now().strftime("%Y-%m-%d")
+        return Response(datos, media_type="application/zip", headers={
+            "Content-Disposition": f'attachment; filename="Informes_DTC_{fecha}.zip"',
+            "X-Informes": str(stats["informes"]),
+            "X-Informes-Con-Error": str(len(stats["errores"])),
+            "X-Informes-Por-Segundo": f"{stats['informes_s']:.2f}",
+        })
+
+    rutas = webio_routes(app, cdn=True) + [
+        Route(ASSETS_PREFIX + "/{nombre}", servir_asset),
+        Route("/api/dtc", api_dtc, methods=["GET", "POST"]),
+        Route("/api/buscar", api_buscar),
+        Route("/api/sesiones", api_sesiones),
+        Route("/metrics", servir_metricas),
+        Mount("/static", app=StaticFiles(directory=PDF_SPOOL_DIR), name="static"),
+    ]
+    if FLOTA_TOKEN:
+        rutas.append(Route("/api/flota", api_flota, methods=["POST"]))
+    if HISTORIAL_TOKEN:
+        rutas += [Route("/api/historial", api_historial), Route("/api/historial/frecuentes", api_frecuentes)]
+    if PERFIL_TOKEN:
+        rutas.append(Route("/debug/perfil", perfil))
+    if precalentar_en_fondo:
+        threading.Thread(target=precalentar, name="dtc-precalentar", daemon=True).start()
+    @asynccontextmanager
+    async def ciclo_de_vida(_app):
+        yield
+        await run_in_threadpool(cerrar_pool_pdf)
+
+    asgi = Starlette(routes=rutas, debug=DEBUG, lifespan=ciclo_de_vida)
+    return metricas.MedidorWS(asgi, _reportar_ws) if MEDIR_WS else asgi
+
 if __name__ == "__main__":
-    start_server(app, host="0.0.0.0", port=8080, debug=True, auto_open_webbrowser=False, show_server_info=False)
+    import argparse
+    parser = argparse.ArgumentParser(description=APP_TITLE)
+    parser.add_argument("--flota", metavar="CSV", help="genera un PDF por vehículo (CSV vehiculo,codigos) y sale")
+    parser.add_argument("--salida", metavar="ZIP", default="informes_dtc.zip", help="ZIP de salida para --flota")
+    parser.add_argument("--workers", type=int, default=FLOTA_WORKERS, help="procesos para --flota")
+    args = parser.parse_args()
+
+    if args.flota:
+        informe_flota_cli(args.flota, args.salida, args.workers)
+    else:
+        # Un solo proceso, todo cargado antes del bind. Arranque rápido: python arranque_dtc.py
+        import uvicorn
+        from arranque_dtc import opciones_uvicorn
+        uvicorn.run(crear_asgi(), host="0.0.0.0", port=int(os.environ.get("PORT", "8080")),
+                    log_level="debug" if DEBUG else "info", **opciones_uvicorn())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# 🚀 Arranque rápido del servidor web
+#
+# En Render free/low la instancia se duerme y el primer visitante espera el arranque en frío.
+# Este módulo no importa PyWebIO ni la app: el servidor abre el puerto enseguida y la app real
+# (PyWebIO, Starlette, assets) se carga en un hilo; los pedidos que llegan mientras tanto
+# esperan a que termine en vez de ser rechazados. Después, en segundo plano, se precalientan
+# tarjetas, índice de búsqueda y motor PDF (ver precalentar() en la app).
+#
+# Ejecutar:
+#   python arranque_dtc.py                      # desarrollo (uvicorn, un proceso)
+#   gunicorn -c gunicorn.conf.py                # producción (usa arranque_dtc:app)
+#   python arranque_dtc.py --profile-startup    # informe de tiempos de arranque e imports
+
+import argparse
+import asyncio
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+MODULO_APP = "app_escaneo_dtc_download_v5"
+
+# permessage-deflate en el websocket de PyWebIO: uvicorn lo negocia si el navegador lo ofrece y
+# comprime cada mensaje con el contexto de los anteriores (las tarjetas repiten mucho texto).
+# WS_DEFLATE=0 lo apaga (ej. si un proxy delante ya comprime). gunicorn.conf.py usa lo mismo.
+WS_DEFLATE = os.environ.get("WS_DEFLATE", "1").lower() not in ("0", "false", "no")
+
+
+def opciones_uvicorn():
+    return {"ws_per_message_deflate": WS_DEFLATE}
+
+
+def _cargar_app():
+    import importlib
+
+    dtc = importlib.import_module(MODULO_APP)
+    return dtc.crear_asgi()
+
+
+class AppDiferida:
+    """App ASGI que responde el lifespan al instante y delega en la real cuando está cargada."""
+
+    def __init__(self, cargar=_cargar_app):
+        self._cargar = cargar
+        self._app = None
+        self._error = None
+        self._lista = None
+
+    def _iniciar(self):
+        loop = asyncio.get_running_loop()
+        self._lista = asyncio.Event()
+
+        def cargar():
+            try:
+                self._app = self._cargar()
+            except BaseException as e:  # se informa en cada pedido; el worker sigue vivo
+                self._error = e
+            loop.call_soon_threadsafe(self._lista.set)
+
+        threading.Thread(target=cargar, name="dtc-carga", daemon=True).start()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] == "lifespan.startup":
+                    if self._lista is None:
+                        self._iniciar()
+                    await send({"type": "lifespan.startup.complete"})
+                elif mensaje["type"] == "lifespan.shutdown":
+                    # La app real no ve el lifespan: su pool de PDF se apaga desde acá.
+                    dtc = sys.modules.get(MODULO_APP)
+                    if dtc is not None:
+                        await asyncio.to_thread(dtc.cerrar_pool_pdf)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if self._lista is None:
+            self._iniciar()
+        await self._lista.wait()
+        if self._error is not None:
+            raise RuntimeError("no se pudo cargar la app") from self._error
+        await self._app(scope, receive, send)
+
+
+app = AppDiferida()
+
+
+# =================== --profile-startup ===================
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def _importtime(modulo):
+    """[(self_us, acumulado_us, profundidad, módulo), ...] de python -X importtime."""
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                            capture_output=True, text=True, check=True).stderr
+    filas = []
+    for linea in salida.splitlines():
+        m = _IMPORTTIME_RE.match(linea)
+        if m:
+            propio, acumulado, sangria, nombre = m.groups()
+            filas.append((int(propio), int(acumulado), len(sangria) // 2, nombre))
+    return filas
+
+
+def _hasta_puerto(port, timeout=60):
+    """Segundos hasta que el servidor (recién lanzado) acepta conexiones y hasta la primera página."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=dict(os.environ, PORT=str(port)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.perf_counter() - t0 > timeout or proc.poll() is not None:
+                    raise RuntimeError("el servidor no abrió el puerto")
+                time.sleep(0.005)
+        escucha = time.perf_counter() - t0
+        urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=timeout).read()
+        return escucha, time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def perfil_arranque(top=15):
+    print("== Tiempo de arranque (proceso nuevo) ==")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    escucha, pagina = _hasta_puerto(port)
+    print(f"acepta conexiones: {escucha * 1e3:8.1f} ms   primera página: {pagina * 1e3:8.1f} ms")
+
+    print(f"\n== Imports (python -X importtime {MODULO_APP}) ==")
+    filas = _importtime(MODULO_APP)
+    total = max(f[1] for f in filas)
+    print(f"total: {total / 1e3:8.1f} ms")
+    print(f"-- imports directos de la app por tiempo acumulado (top {top})")
+    for propio, acumulado, _, nombre in sorted((f for f in filas if f[2] == 1), key=lambda f: -f[1])[:top]:
+        print(f"  {acumulado / 1e3:8.1f} ms  {nombre}")
+    print(f"-- módulos por tiempo propio (top {top})")
+    for propio, acumulado, _, nombre in sorted(filas, key=lambda f: -f[0])[:top]:
+        print(f"  {propio / 1e3:8.1f} ms  {nombre}")
+
+    print("\n== Fases en este proceso ==")
+    t = time.perf_counter()
+    import importlib
+    dtc = importlib.import_module(MODULO_APP)
+    print(f"import app          : {(time.perf_counter() - t) * 1e3:8.1f} ms")
+    t = time.perf_counter()
+    dtc.crear_asgi(precalentar_en_fondo=False)
+    print(f"crear_asgi          : {(time.perf_counter() - t) * 1e3:8.1f} ms")
+    for nombre, segundos in dtc.precalentar().items():
+        print(f"precalentar {nombre:<8}: {segundos * 1e3:8.1f} ms   (en segundo plano, después del bind)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arranque rápido del Asistente DTC")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="mide bind, primera página, imports y fases de arranque, y sale")
+    args = parser.parse_args(argv)
+    if args.profile_startup:
+        perfil_arranque()
+        return 0
+    import uvicorn
+    debug = os.environ.get("DEBUG", "").lower() in ("1", "true", "si", "sí")
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8080")),
+                log_level="debug" if debug else "info", **opciones_uvicorn())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
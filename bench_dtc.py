@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# ⏱️ Benchmarks del Asistente DTC
+#
+# Ejecutar:
+#   python bench_dtc.py                          # lookup, render, parser, búsqueda, correlación, PDF e historial
+#   python bench_dtc.py rss                      # pico de RSS al exportar PDF (memoria vs streaming)
+#   python bench_dtc.py sesiones                 # sesiones websocket concurrentes (levanta el servidor)
+#   python bench_dtc.py bytes                    # bytes por búsqueda en el websocket (levanta el servidor)
+#   python bench_dtc.py todo --json bench.json   # todas las secciones + resultados en JSON
+#   python bench_dtc.py --baseline bench_baseline.json              # marca regresiones (> --umbral)
+#   python bench_dtc.py --guardar-baseline bench_baseline.json      # actualiza la referencia
+#
+# Cada sección devuelve {métrica: (valor, unidad)}. En "ms", "µs", "MiB" y "B" menos es mejor;
+# en "req/s" más es mejor. La baseline guardada es de una máquina concreta: regenerarla en
+# la máquina donde se compara.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+
+import app_escaneo_dtc_download_v5 as dtc
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+UMBRAL = 0.25
+MAS_ES_MEJOR = ("req/s",)
+
+
+def _mejor(fn, repeticiones=5, numero=20):
+    """Mejor tiempo (s) de `numero` corridas de fn, sobre `repeticiones` intentos."""
+    return min(timeit.repeat(fn, repeat=repeticiones, number=numero)) / numero
+
+
+def _cadena_if(rangos):
+    """info_codigo como era antes de la tabla: un `if` por rango, en orden, primera coincidencia gana.
+
+    Se genera desde RANGOS_DTC (mismas comparaciones y mismos resultados que la cadena original).
+    """
+    lineas = ["def info_codigo_cadena(num):"]
+    for lo, hi, *info in rangos:
+        condicion = f"{lo} == num" if lo == hi else f"{lo} <= num <= {hi}"
+        lineas.append(f"    if {condicion}: return {tuple(info)!r}")
+    lineas.append(f"    return {dtc.INFO_GENERAL!r}")
+    espacio = {}
+    exec("\n".join(lineas), espacio)
+    return espacio["info_codigo_cadena"]
+
+
+def bench_info_codigo():
+    codigos = range(1, 1000)
+    info_codigo_cadena = _cadena_if(dtc.RANGOS_DTC)
+    cadena = _mejor(lambda: [info_codigo_cadena(n) for n in codigos])
+    tabla = _mejor(lambda: [dtc.info_codigo(n) for n in codigos])
+    print(f"info_codigo 1–999  cadena de if: {cadena * 1e6:9.1f} µs   tabla: {tabla * 1e6:9.1f} µs   "
+          f"(x{cadena / tabla:.1f})")
+    return {"info_codigo_cadena_999": (cadena * 1e6, "µs"), "info_codigo_999": (tabla * 1e6, "µs")}
+
+
+def bench_render_entry():
+    codigos = range(1, 1000)
+    dtc._render_tarjeta.cache_clear()
+    frio = _mejor(lambda: (dtc._render_tarjeta.cache_clear(), [dtc.render_entry(n) for n in codigos]),
+                  repeticiones=3, numero=3)
+    caliente = _mejor(lambda: [dtc.render_entry(n) for n in codigos])
+    print(f"render_entry 1–999 frío:   {frio * 1e3:9.2f} ms   caliente: {caliente * 1e3:9.2f} ms   "
+          f"{dtc.render_cache_stats()}")
+    return {"render_999_frio": (frio * 1e3, "ms"), "render_999_caliente": (caliente * 1e3, "ms")}
+
+
+def _volcado_escaner(n_tokens, semilla=0):
+    """Texto tipo export de escáner: DTC de las 4 familias, sufijos, ruido de freeze frame."""
+    rnd = random.Random(semilla)
+    piezas = []
+    for _ in range(n_tokens):
+        r = rnd.random()
+        if r < 0.5:
+            piezas.append(f"P0{rnd.randint(1, 999):03d}")
+        elif r < 0.7:
+            piezas.append(f"{rnd.choice('PCBU')}{rnd.randint(0, 3)}{rnd.randint(0, 0xFFF):03X}-{rnd.randint(0, 0xFF):02X}")
+        else:
+            piezas.append(rnd.choice(["RPM", "800", "ECT:", "90°C", "LOAD", "35%", "Freeze", "frame"]))
+    return " ".join(piezas)
+
+
+def bench_parse():
+    metricas = {}
+    for n in (10, 1_000, 100_000):
+        texto = _volcado_escaner(n)
+        numero = max(1, 10_000 // n)
+        t = _mejor(lambda: dtc.parse_dtc(texto), repeticiones=3, numero=numero)
+        print(f"parse_dtc {n:>7} tokens: {t * 1e3:9.3f} ms   ({n / t / 1e6:5.2f} M tokens/s)")
+        metricas[f"parse_dtc_{n}"] = (t * 1e3, "ms")
+    texto = _volcado_escaner(1_000)
+    t = _mejor(lambda: dtc.parse_codes(texto), repeticiones=3, numero=10)
+    print(f"parse_codes      1000 tokens: {t * 1e3:9.3f} ms")
+    metricas["parse_codes_1000"] = (t * 1e3, "ms")
+    crudos = _volcado_escaner(100_000).split()
+    t = _mejor(lambda: dtc.normalizar_lote(crudos), repeticiones=3, numero=1)
+    print(f"normalizar_lote 100000 entradas: {t * 1e3:9.3f} ms")
+    metricas["normalizar_lote_100000"] = (t * 1e3, "ms")
+    return metricas
+
+
+CONSULTAS_SINTOMA = ("mezcla pobre", "misfire", "catalizdor", "5 V", "presion combustible", "sensor ox",
+                     "P017", "encendido bobina", "transmision", "xyzzy")
+
+
+def bench_busqueda():
+    dtc.indice_sintomas.cache_clear()
+    armado = _mejor(lambda: (dtc.indice_sintomas.cache_clear(), dtc.indice_sintomas()), repeticiones=3, numero=1)
+    print(f"índice síntomas: {len(dtc.indice_sintomas())} códigos armado en {armado * 1e3:7.1f} ms")
+    indice = dtc.indice_sintomas()
+    # Sin la caché de consultas: cada tecla nueva es una consulta distinta
+    buscar = indice.buscar.__wrapped__
+    peor = 0.0
+    for consulta in CONSULTAS_SINTOMA:
+        t = _mejor(lambda: buscar(consulta, dtc.BUSQUEDA_LIMITE), repeticiones=3, numero=50)
+        peor = max(peor, t)
+        print(f"  {consulta!r:24} {t * 1e3:7.3f} ms   {len(buscar(consulta, dtc.BUSQUEDA_LIMITE))} resultados")
+    print(f"búsqueda por síntoma peor caso: {peor * 1e3:7.3f} ms (objetivo < 5 ms)")
+    return {"indice_sintomas_armado": (armado * 1e3, "ms"), "busqueda_peor_consulta": (peor * 1e3, "ms")}
+
+
+def bench_correlacion():
+    """Reglas de combinación sobre un volcado de escáner de 200 códigos: las reales y 500 sintéticas."""
+    from correlacion_dtc import MotorReglas, Regla
+
+    rnd = random.Random(0)
+    volcado = tuple(sorted({f"P0{rnd.randint(1, 999):03d}" for _ in range(400)})[:200])
+    motor = MotorReglas(dtc.REGLAS_CORRELACION)
+    reales = _mejor(lambda: motor.evaluar(volcado), numero=200)
+    sinteticas = [Regla(f"r{i}", rnd.randint(1, 100),
+                        [",".join(f"P0{rnd.randint(1, 999):03d}" for _ in range(rnd.randint(1, 6)))
+                         for _ in range(rnd.randint(2, 4))], "causa")
+                  for i in range(500)]
+    armado = _mejor(lambda: MotorReglas(dtc.REGLAS_CORRELACION + tuple(sinteticas)), repeticiones=3, numero=1)
+    grande = MotorReglas(dtc.REGLAS_CORRELACION + tuple(sinteticas))
+    peor = _mejor(lambda: grande.evaluar(volcado), numero=200)
+    print(f"correlación 200 códigos  {len(motor)} reglas: {reales * 1e3:6.3f} ms "
+          f"({len(motor.evaluar(volcado))} causas)   {len(grande)} reglas: {peor * 1e3:6.3f} ms "
+          f"({len(grande.evaluar(volcado))} causas, armado {armado * 1e3:.1f} ms)   (objetivo < 1 ms)")
+    return {"correlacion_200_reglas_app": (reales * 1e3, "ms"), "correlacion_200_reglas_520": (peor * 1e3, "ms")}
+
+
+def bench_pdf():
+    """Lo que hace export_pdf_download según el tamaño: PDF en memoria, o a disco desde
+    PDF_STREAM_MIN_CODIGOS. Se mide en este proceso (sin el pool) para aislar el armado."""
+    metricas = {}
+    destino = os.path.join(dtc.tempfile.gettempdir(), f"bench_dtc_{os.getpid()}.pdf")
+    for n in (1, 10, 100, 999):
+        codigos, fecha = dtc.clave_pdf([f"P{i:04d}" for i in range(1, n + 1)], "bench")
+        if n >= dtc.PDF_STREAM_MIN_CODIGOS:
+            modo, fn = "streaming", lambda: dtc.construir_pdf(codigos, fecha, destino)
+        else:
+            modo, fn = "memoria", lambda: dtc.construir_pdf(codigos, fecha)
+        fn()  # importa reportlab y arma los estilos
+        t = _mejor(fn, repeticiones=3, numero=1)
+        print(f"export PDF {n:>4} códigos ({modo:>9}): {t * 1e3:9.1f} ms")
+        metricas[f"export_pdf_{n}"] = (t * 1e3, "ms")
+    if os.path.exists(destino):
+        os.remove(destino)
+    return metricas
+
+
+def bench_historial():
+    """Encolar una búsqueda (lo que paga buscar_por_codigo) y consultas indexadas sobre 50.000 búsquedas."""
+    import historial_dtc
+
+    rnd = random.Random(0)
+    path = os.path.join(dtc.tempfile.gettempdir(), f"bench_historial_{os.getpid()}.sqlite3")
+    h = historial_dtc.Historial(path)
+    try:
+        vehiculos = [f"AB{i:03d}CD" for i in range(2_000)]
+        for i in range(50_000):
+            codigos = [f"P0{rnd.randint(1, 999):03d}" for _ in range(rnd.randint(1, 4))]
+            h.registrar(codigos, rnd.choice(vehiculos), ts=1_700_000_000 + i * 60)
+        encolar = _mejor(lambda: h.registrar(("P0171", "P0300"), "AB001CD"), repeticiones=3, numero=1000)
+        h.vaciar()
+        por_vehiculo = _mejor(lambda: h.historial_vehiculo("AB001CD", 10), repeticiones=3, numero=200)
+        por_codigo = _mejor(lambda: h.vehiculos_con_codigo("P0171", 50), repeticiones=3, numero=50)
+        frecuentes = _mejor(lambda: h.codigos_frecuentes(20, 1_700_000_000 + 49_000 * 60), repeticiones=3, numero=20)
+        frecuentes_todo = _mejor(lambda: h.codigos_frecuentes(20), repeticiones=3, numero=3)
+    finally:
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(path + sufijo):
+                os.remove(path + sufijo)
+    print(f"historial 50000 búsquedas   encolar: {encolar * 1e6:7.1f} µs   "
+          f"por vehículo: {por_vehiculo * 1e3:6.3f} ms   por código: {por_codigo * 1e3:6.3f} ms")
+    print(f"historial frecuentes  último día: {frecuentes * 1e3:7.2f} ms   todo: {frecuentes_todo * 1e3:7.2f} ms")
+    return {"historial_encolar": (encolar * 1e6, "µs"), "historial_vehiculo": (por_vehiculo * 1e3, "ms"),
+            "historial_codigo": (por_codigo * 1e3, "ms"), "historial_frecuentes_dia": (frecuentes * 1e3, "ms"),
+            "historial_frecuentes_todo": (frecuentes_todo * 1e3, "ms")}
+
+
+def _rss_hijo(modo, n):
+    """Corre en un proceso aparte: exporta n códigos y reporta el pico de RSS (KiB) web/worker."""
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    codigos, fecha = dtc.clave_pdf([f"P{i:04d}" for i in range(1, n + 1)], "bench")
+    generar = dtc.publicar_pdf if modo == "memoria" else dtc.generar_pdf_archivo
+    ruta = os.path.join(dtc.PDF_SPOOL_DIR, generar(codigos, fecha))
+    with open(ruta, "rb") as f:  # lo que hace el handler estático: bloques de 64 KiB
+        while f.read(64 * 1024):
+            pass
+    os.remove(ruta)
+    web = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Los procesos del pool son hijos del forkserver, no de éste: se le pregunta al worker (PDF_WORKERS=1).
+    worker = dtc._pool().submit(resource.getrusage, resource.RUSAGE_SELF).result().ru_maxrss
+    dtc._pool().shutdown()
+    print(base, web, worker)
+
+
+def bench_pdf_rss():
+    metricas = {}
+    entorno = dict(os.environ, PDF_WORKERS="1", PDF_SPOOL_DIR=os.path.join(dtc.tempfile.gettempdir(), "dtc_pdf_bench"))
+    for n in (10, 100, 999):
+        for modo in ("memoria", "streaming"):
+            salida = subprocess.run([sys.executable, __file__, "_rss", modo, str(n)], env=entorno,
+                                    capture_output=True, text=True, check=True).stdout.split()
+            base, web, worker = (int(v) / 1024 for v in salida)
+            print(f"PDF {n:>4} códigos {modo:>9}: web +{web - base:6.1f} MiB (pico {web:6.1f})   "
+                  f"worker pico {worker:6.1f} MiB")
+            metricas[f"rss_web_{modo}_{n}"] = (web - base, "MiB")
+    return metricas
+
+
+SESIONES_CLIENTES = 16
+SESIONES_DURACION = 5.0
+SESIONES_CODIGOS = "P0171 P0300 P0420"
+
+
+@contextmanager
+def _servidor(url=None):
+    """`url` tal cual, o un servidor propio (python app_escaneo_dtc_download_v5.py) mientras dure el with."""
+    import loadtest_dtc
+
+    if url is not None:
+        yield url
+        return
+    port = loadtest_dtc._puerto_libre()
+    proc = subprocess.Popen([sys.executable, dtc.__file__], env=dict(os.environ, PORT=str(port)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        loadtest_dtc._esperar_puerto(port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def bench_sesiones(url=None):
+    """Sesiones websocket concurrentes (abrir la app + una búsqueda) contra `url` o un servidor propio."""
+    import loadtest_dtc
+
+    with _servidor(url) as url:
+        r = asyncio.run(loadtest_dtc.correr(url, SESIONES_CLIENTES, SESIONES_DURACION, SESIONES_CODIGOS))
+    print(f"sesiones ({SESIONES_CLIENTES} clientes, buscando {SESIONES_CODIGOS!r}): {r['req_s']:7.1f} sesiones/s   "
+          f"p50 {r['sesion_p50_ms']:7.1f} ms   p99 {r['sesion_p99_ms']:7.1f} ms   errores {r['errores']}")
+    return {"sesiones_por_s": (r["req_s"], "req/s"), "sesion_p50": (r["sesion_p50_ms"], "ms"),
+            "sesion_p99": (r["sesion_p99_ms"], "ms"), "errores": (r["errores"], "errores")}
+
+
+BYTES_CODIGOS = " ".join(f"P{n:04d}" for n in range(171, 201))
+
+
+def bench_bytes(url=None):
+    """Bytes que manda el websocket por una búsqueda de 30 códigos, sin comprimir y con permessage-deflate."""
+    import loadtest_dtc
+
+    with _servidor(url) as url:
+        u = urlparse(url)
+        conteo = {}
+        asyncio.run(loadtest_dtc._sesion(f"ws://{u.hostname}:{u.port}/?app=index", BYTES_CODIGOS, conteo))
+    print(f"bytes por búsqueda ({len(BYTES_CODIGOS.split())} códigos, {conteo['mensajes']} mensajes): "
+          f"sin comprimir {conteo['bytes']} B   con deflate ≈{conteo['deflate']} B   "
+          f"(x{conteo['bytes'] / conteo['deflate']:.1f})")
+    return {"ws_bytes_busqueda_30": (conteo["bytes"], "B"), "ws_bytes_busqueda_30_deflate": (conteo["deflate"], "B")}
+
+
+SECCIONES = {
+    "lookup": bench_info_codigo,
+    "render": bench_render_entry,
+    "parse": bench_parse,
+    "busqueda": bench_busqueda,
+    "correlacion": bench_correlacion,
+    "pdf": bench_pdf,
+    "historial": bench_historial,
+    "rss": bench_pdf_rss,
+    "sesiones": bench_sesiones,
+    "bytes": bench_bytes,
+}
+CON_SERVIDOR = ("sesiones", "bytes")
+POR_DEFECTO = ("lookup", "render", "parse", "busqueda", "correlacion", "pdf", "historial")
+
+
+def regresiones(resultados, baseline, umbral=UMBRAL):
+    """[(métrica, base, actual, variación), ...] de las métricas que empeoraron más de `umbral`."""
+    peores = []
+    for seccion, metricas in resultados.items():
+        for nombre, actual in metricas.items():
+            base = baseline.get("resultados", {}).get(seccion, {}).get(nombre)
+            if base is None or base["unidad"] != actual["unidad"]:
+                continue
+            if actual["unidad"] == "errores":
+                if actual["valor"] > base["valor"]:
+                    peores.append((f"{seccion}.{nombre}", base["valor"], actual["valor"], float("inf")))
+                continue
+            if not base["valor"] or not actual["valor"]:
+                continue
+            if actual["unidad"] in MAS_ES_MEJOR:
+                variacion = base["valor"] / actual["valor"] - 1
+            else:
+                variacion = actual["valor"] / base["valor"] - 1
+            if variacion > umbral:
+                peores.append((f"{seccion}.{nombre}", base["valor"], actual["valor"], variacion))
+    return peores
+
+
+def main(argv):
+    if argv[:1] == ["_rss"]:
+        _rss_hijo(argv[1], int(argv[2]))
+        return 0
+    ap = argparse.ArgumentParser(description="Benchmarks del Asistente DTC")
+    ap.add_argument("secciones", nargs="*", metavar="SECCION",
+                    help=f"{', '.join(SECCIONES)} o 'todo' (default: {' '.join(POR_DEFECTO)})")
+    ap.add_argument("--json", metavar="ARCHIVO", help="escribe los resultados en JSON")
+    ap.add_argument("--baseline", metavar="ARCHIVO", help="compara contra una corrida guardada")
+    ap.add_argument("--guardar-baseline", metavar="ARCHIVO", nargs="?", const=BASELINE_PATH,
+                    help=f"guarda esta corrida como referencia (default: {os.path.basename(BASELINE_PATH)})")
+    ap.add_argument("--umbral", type=float, default=UMBRAL, help="empeoramiento tolerado (0.25 = 25%%)")
+    ap.add_argument("--url", help="servidor ya levantado para 'sesiones' y 'bytes' (si no, se levanta uno)")
+    args = ap.parse_args(argv)
+
+    secciones = list(SECCIONES) if args.secciones == ["todo"] else args.secciones or list(POR_DEFECTO)
+    desconocidas = [s for s in secciones if s not in SECCIONES]
+    if desconocidas:
+        ap.error(f"sección desconocida: {', '.join(desconocidas)}")
+
+    avisos = dtc.validar_rangos()
+    for aviso in avisos:
+        print(f"⚠️ {aviso}")
+
+    resultados = {}
+    for nombre in secciones:
+        metricas = SECCIONES[nombre](args.url) if nombre in CON_SERVIDOR else SECCIONES[nombre]()
+        resultados[nombre] = {k: {"valor": round(v, 4), "unidad": u} for k, (v, u) in metricas.items()}
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "cpus": os.cpu_count(),
+        "resultados": resultados,
+    }
+    for destino in filter(None, (args.json, args.guardar_baseline)):
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"resultados → {destino}")
+
+    peores = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            peores = regresiones(resultados, json.load(f), args.umbral)
+        for metrica, base, actual, variacion in peores:
+            print(f"🔻 regresión {metrica}: {base:g} → {actual:g} (+{variacion * 100:.0f}%)")
+        if not peores:
+            print(f"sin regresiones respecto de {args.baseline} (umbral {args.umbral * 100:.0f}%)")
+    return 1 if avisos or peores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
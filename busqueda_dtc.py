@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# 🔍 Índice invertido para buscar DTC por síntoma ("mezcla pobre", "misfire", "catalizador", "5 V")
+#
+# - Tokens en minúscula y sin acentos; se descartan palabras vacías del español.
+# - Cada término coincide exacto o con un error de tipeo (distancia de edición 1; 2 para
+#   palabras largas) vía índice de borrados. El último término además por prefijo: es la
+#   palabra que se está escribiendo (búsqueda mientras se escribe).
+# - Ranking: suma de pesos por campo (código > descripción > sistema/notas > pasos), con
+#   penalización para prefijos y typos. Se piden todos los términos; si nadie los tiene
+#   todos, se devuelve el mejor resultado parcial.
+
+import re
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+
+STOPWORDS = frozenset(
+    "a al con de del el en es la las lo los o para por que se si sin su un una y".split()
+)
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+FACTOR_PREFIJO = 0.6
+FACTOR_TYPO = 0.4
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni diacríticos ('Presión' → 'presion')."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return [t for t in _TOKEN_RE.findall(normalizar(texto)) if t not in STOPWORDS]
+
+
+def _borrados(termino, distancia):
+    """Variantes de `termino` con hasta `distancia` caracteres borrados (incluye el término)."""
+    variantes = {termino}
+    frontera = {termino}
+    for _ in range(distancia):
+        frontera = {t[:i] + t[i + 1:] for t in frontera for i in range(len(t))}
+        variantes |= frontera
+    return variantes
+
+
+def _distancia(a, b, tope):
+    """Damerau-Levenshtein (transposición adyacente), cortando si supera `tope`."""
+    if abs(len(a) - len(b)) > tope:
+        return tope + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        fila = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            fila[j] = min(prev[j] + 1, fila[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                fila[j] = min(fila[j], prev2[j - 2] + 1)
+        if min(fila) > tope:
+            return tope + 1
+        prev2, prev = prev, fila
+    return prev[-1]
+
+
+def _tope_typos(termino):
+    if len(termino) < 4:
+        return 0
+    return 1 if len(termino) < 8 else 2
+
+
+class IndiceTexto:
+    """Índice invertido término → {doc: peso}. Se arma una vez y después sólo se consulta."""
+
+    def __init__(self):
+        self._postings = {}
+        self._vocabulario = []
+        self._borrados = {}
+        self.documentos = {}
+
+    def agregar(self, doc_id, campos, extra=None):
+        """`campos`: [(texto, peso), ...]. `extra` se devuelve tal cual en los resultados."""
+        self.documentos[doc_id] = extra
+        for texto, peso in campos:
+            for token in tokenizar(texto):
+                docs = self._postings.setdefault(token, {})
+                docs[doc_id] = docs.get(doc_id, 0.0) + peso
+
+    def cerrar(self):
+        """Prepara vocabulario ordenado (prefijos) e índice de borrados (typos)."""
+        self._vocabulario = sorted(self._postings)
+        for termino in self._vocabulario:
+            for variante in _borrados(termino, _tope_typos(termino)):
+                self._borrados.setdefault(variante, []).append(termino)
+        self.buscar = lru_cache(maxsize=1024)(self.buscar)
+        return self
+
+    def _prefijos(self, token):
+        i = bisect_left(self._vocabulario, token)
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(token):
+            yield self._vocabulario[i]
+            i += 1
+
+    def _typos(self, token):
+        tope = _tope_typos(token)
+        if not tope:
+            return ()
+        candidatos = {t for v in _borrados(token, tope) for t in self._borrados.get(v, ())}
+        return [t for t in candidatos if t != token and _distancia(token, t, tope) <= tope]
+
+    def _puntajes(self, token, prefijo):
+        """{doc: puntaje} para un token de la consulta, con el mejor tipo de coincidencia por doc."""
+        puntajes = dict(self._postings.get(token, {}))
+        if prefijo and len(token) > 1:
+            for termino in self._prefijos(token):
+                if termino != token:
+                    for doc, peso in self._postings[termino].items():
+                        puntajes[doc] = max(puntajes.get(doc, 0.0), peso * FACTOR_PREFIJO)
+        if not puntajes and not token.isdigit():
+            for termino in self._typos(token):
+                for doc, peso in self._postings[termino].items():
+                    puntajes[doc] = max(puntajes.get(doc, 0.0), peso * FACTOR_TYPO)
+        return puntajes
+
+    def buscar(self, consulta, limite=20):
+        """((doc_id, puntaje, extra), ...) ordenado por relevancia."""
+        tokens = list(dict.fromkeys(tokenizar(consulta)))
+        if not tokens:
+            return ()
+        por_token = [self._puntajes(t, i == len(tokens) - 1) for i, t in enumerate(tokens)]
+        comunes = set.intersection(*(set(p) for p in por_token))
+        candidatos = comunes or set().union(*por_token)
+        total = {doc: sum(p.get(doc, 0.0) for p in por_token) for doc in candidatos}
+        mejores = sorted(total.items(), key=lambda kv: (-kv[1], kv[0]))[:limite]
+        return tuple((doc, puntaje, self.documentos[doc]) for doc, puntaje in mejores)
+
+    def __len__(self):
+        return len(self.documentos)
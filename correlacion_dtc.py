@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# 🧭 Correlación de códigos: reglas sobre combinaciones de DTC → causa raíz probable
+#
+# Un escaneo real trae códigos relacionados (P0171+P0174, P0300+P0420, P0335+P0340) que,
+# leídos juntos, apuntan a una causa común. Cada regla es una lista de grupos de códigos
+# ("P0171", "P0420,P0430", "P0300-P0312") y se cumple si al menos `minimo` grupos tienen
+# algún código presente (por defecto, todos).
+#
+# Las reglas se compilan una vez a bitsets:
+#   - cada código mencionado en alguna regla recibe un bit; cada grupo es una máscara,
+#   - índice código → máscara de reglas que lo mencionan.
+# Evaluar un escaneo es O(códigos) para armar la máscara presente + sólo las reglas
+# candidatas (las que tocan algún código presente), con AND de enteros por grupo.
+
+FORMATO_RANGO = "{}{:04d}"
+
+
+def _expandir(spec):
+    """'P0420,P0430' / 'P0300-P0312' / 'P0171' → tupla de códigos."""
+    codigos = []
+    for parte in spec.upper().replace(" ", "").split(","):
+        if "-" in parte:
+            desde, hasta = parte.split("-")
+            if desde[0] != hasta[0] or not (desde[1:].isdigit() and hasta[1:].isdigit()):
+                raise ValueError(f"Rango inválido: {parte!r} (sólo rangos numéricos de una misma familia)")
+            codigos += [FORMATO_RANGO.format(desde[0], n) for n in range(int(desde[1:]), int(hasta[1:]) + 1)]
+        elif parte:
+            codigos.append(parte)
+    return tuple(codigos)
+
+
+def cada(spec):
+    """Un grupo por código: con `minimo` expresa 'al menos N de estos' (ej. 2 cilindros)."""
+    return _expandir(spec)
+
+
+class Regla:
+    __slots__ = ("id", "prioridad", "grupos", "causa", "detalle", "minimo", "reemplaza")
+
+    def __init__(self, id, prioridad, grupos, causa, detalle="", minimo=None, reemplaza=()):
+        self.id, self.prioridad, self.causa, self.detalle = id, prioridad, causa, detalle
+        self.grupos = tuple(grupos)
+        self.minimo = len(self.grupos) if minimo is None else minimo
+        self.reemplaza = tuple(reemplaza)
+        if not 1 <= self.minimo <= len(self.grupos):
+            raise ValueError(f"Regla {id!r}: minimo={self.minimo} con {len(self.grupos)} grupos")
+
+
+class MotorReglas:
+    """Reglas compiladas. evaluar(códigos) → ((id, prioridad, causa, detalle, códigos), ...)."""
+
+    def __init__(self, reglas):
+        self.reglas = tuple(reglas)
+        ids = [r.id for r in self.reglas]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Hay reglas con el mismo id")
+        posicion = {id_: i for i, id_ in enumerate(ids)}
+        self._bits = {}          # código → n.º de bit
+        self._codigos = []       # n.º de bit → código
+        self._reglas_de = {}     # código → máscara de reglas que lo mencionan
+        self._grupos = []        # por regla: máscaras de sus grupos
+        self._mascaras = []      # por regla: OR de sus grupos
+        self._reemplazos = []    # por regla: máscara de reglas que suprime
+        for i, regla in enumerate(self.reglas):
+            grupos = []
+            for spec in regla.grupos:
+                mascara = 0
+                for codigo in _expandir(spec):
+                    if codigo not in self._bits:
+                        self._bits[codigo] = len(self._codigos)
+                        self._codigos.append(codigo)
+                    mascara |= 1 << self._bits[codigo]
+                    self._reglas_de[codigo] = self._reglas_de.get(codigo, 0) | (1 << i)
+                grupos.append(mascara)
+            self._grupos.append(tuple(grupos))
+            mascara_regla = 0
+            for g in grupos:
+                mascara_regla |= g
+            self._mascaras.append(mascara_regla)
+            reemplazo = 0
+            for otro in regla.reemplaza:
+                if otro not in posicion:
+                    raise ValueError(f"Regla {regla.id!r} reemplaza a {otro!r}, que no existe")
+                reemplazo |= 1 << posicion[otro]
+            self._reemplazos.append(reemplazo)
+
+    def evaluar(self, codigos):
+        """Hallazgos de mayor a menor prioridad (a igual prioridad, los que explican más códigos)."""
+        presentes = candidatas = 0
+        for codigo in codigos:
+            bit = self._bits.get(codigo)
+            if bit is not None:
+                presentes |= 1 << bit
+                candidatas |= self._reglas_de[codigo]
+        cumplidas = suprimidas = 0
+        while candidatas:
+            menor = candidatas & -candidatas
+            i = menor.bit_length() - 1
+            candidatas ^= menor
+            regla = self.reglas[i]
+            aciertos = 0
+            for grupo in self._grupos[i]:
+                if presentes & grupo:
+                    aciertos += 1
+            if aciertos >= regla.minimo:
+                cumplidas |= menor
+                suprimidas |= self._reemplazos[i]
+        cumplidas &= ~suprimidas
+        hallazgos = []
+        while cumplidas:
+            menor = cumplidas & -cumplidas
+            i = menor.bit_length() - 1
+            cumplidas ^= menor
+            regla = self.reglas[i]
+            hallazgos.append((regla.id, regla.prioridad, regla.causa, regla.detalle,
+                              self._codigos_de(presentes & self._mascaras[i]), i))
+        hallazgos.sort(key=lambda h: (-h[1], -len(h[4]), h[5]))
+        return tuple(h[:5] for h in hallazgos)
+
+    def _codigos_de(self, mascara):
+        codigos = []
+        while mascara:
+            menor = mascara & -mascara
+            codigos.append(self._codigos[menor.bit_length() - 1])
+            mascara ^= menor
+        return tuple(sorted(codigos))
+
+    def __len__(self):
+        return len(self.reglas)
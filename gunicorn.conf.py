@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Configuración de producción: gunicorn + workers uvicorn sobre la app ASGI.
+#
+# Ejecutar:
+#   gunicorn -c gunicorn.conf.py
+
+import os
+
+from uvicorn.workers import UvicornWorker
+
+from arranque_dtc import opciones_uvicorn
+
+
+class WorkerDTC(UvicornWorker):
+    # Mismas opciones de websocket (WS_DEFLATE) que el modo desarrollo.
+    CONFIG_KWARGS = dict(UvicornWorker.CONFIG_KWARGS, **opciones_uvicorn())
+
+
+wsgi_app = "arranque_dtc:app"
+worker_class = WorkerDTC
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+
+# El maestro sólo carga arranque_dtc (liviano) y abre el puerto enseguida; cada worker importa
+# la app en segundo plano. Precargarla en el maestro compartiría páginas al forkear, pero
+# demoraría el bind todo lo que tarda importar PyWebIO: en arranques en frío pesa más lo segundo.
+preload_app = False
+
+# Los workers uvicorn reportan heartbeat desde su event loop; los websockets largos no lo afectan.
+graceful_timeout = 20
+keepalive = 75
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# 🗂️ Historial de búsquedas por vehículo (SQLite en modo WAL)
+#
+# Cada búsqueda guarda sus códigos, la patente/VIN (opcional), la fecha y, si se exportó, la fecha
+# del PDF: el archivo del spool es temporal, pero con códigos + fecha + vehículo se regenera igual.
+# Las escrituras no tocan el camino del pedido: registrar() sólo encola, y un hilo escritor
+# vacía la cola en lotes, una transacción por lote. Las lecturas usan una conexión por hilo;
+# con WAL no se bloquean con el escritor (ni con los de otros workers sobre el mismo archivo).
+#
+# Esquema:
+#   busquedas(id, ref, ts, vehiculo, codigos, pdf)   índice (vehiculo, ts)
+#   busqueda_codigos(codigo, busqueda_id)            clave (codigo, busqueda_id): índice por código,
+#                                                    más (busqueda_id, codigo) para filtrar por fecha
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+LOTE_MAX = 500
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS busquedas (
+    id       INTEGER PRIMARY KEY,
+    ref      TEXT NOT NULL UNIQUE,
+    ts       REAL NOT NULL,
+    vehiculo TEXT,
+    codigos  TEXT NOT NULL,
+    pdf      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_busquedas_vehiculo ON busquedas (vehiculo, ts);
+CREATE INDEX IF NOT EXISTS idx_busquedas_ts ON busquedas (ts);
+CREATE TABLE IF NOT EXISTS busqueda_codigos (
+    codigo      TEXT NOT NULL,
+    busqueda_id INTEGER NOT NULL REFERENCES busquedas (id),
+    PRIMARY KEY (codigo, busqueda_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_codigos_busqueda ON busqueda_codigos (busqueda_id, codigo);
+"""
+
+
+def normalizar_vehiculo(texto):
+    """'ab 123 cd' → 'AB123CD': la misma patente/VIN escrita distinto cae en el mismo historial."""
+    return re.sub(r"[^0-9A-Z]", "", (texto or "").upper())
+
+
+class Historial:
+    def __init__(self, path):
+        self.path = path
+        carpeta = os.path.dirname(path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        con = self._conectar()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_ESQUEMA)
+        finally:
+            con.close()
+        self._cola = queue.Queue()
+        self._local = threading.local()
+        self._escritor = threading.Thread(target=self._escribir, name="dtc-historial", daemon=True)
+        self._escritor.start()
+
+    def _conectar(self):
+        con = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA busy_timeout=5000")
+        return con
+
+    def _lectura(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._conectar()
+        return con
+
+    # --- escrituras (encoladas) ---
+    def registrar(self, codigos, vehiculo="", ts=None):
+        """Encola una búsqueda y devuelve su referencia (para asociarle el PDF después)."""
+        ref = uuid.uuid4().hex
+        self._cola.put(("busqueda", ref, time.time() if ts is None else ts,
+                        normalizar_vehiculo(vehiculo) or None, tuple(codigos)))
+        return ref
+
+    def registrar_pdf(self, ref, fecha):
+        """Marca la búsqueda `ref` como exportada a PDF con la fecha de informe `fecha` (YYYY-MM-DD)."""
+        self._cola.put(("pdf", ref, fecha))
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def vaciar(self, timeout=None):
+        """Espera a que el escritor procese todo lo encolado hasta ahora."""
+        listo = threading.Event()
+        self._cola.put(("marca", listo))
+        return listo.wait(timeout)
+
+    def _escribir(self):
+        con = self._conectar()
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < LOTE_MAX:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            marcas = []
+            try:
+                with con:
+                    for tarea in lote:
+                        if tarea[0] == "busqueda":
+                            _, ref, ts, vehiculo, codigos = tarea
+                            cur = con.execute(
+                                "INSERT INTO busquedas (ref, ts, vehiculo, codigos) VALUES (?, ?, ?, ?)",
+                                (ref, ts, vehiculo, " ".join(codigos)))
+                            con.executemany(
+                                "INSERT OR IGNORE INTO busqueda_codigos (codigo, busqueda_id) VALUES (?, ?)",
+                                [(c, cur.lastrowid) for c in codigos])
+                        elif tarea[0] == "pdf":
+                            con.execute("UPDATE busquedas SET pdf = ? WHERE ref = ?", (tarea[2], tarea[1]))
+                        else:
+                            marcas.append(tarea[1])
+            except sqlite3.Error as e:  # un lote fallido no debe tumbar el hilo escritor
+                print(f"⚠️ historial: no se pudo guardar un lote de {len(lote)}: {e}")
+            for marca in marcas:
+                marca.set()
+
+    # --- lecturas (consultas indexadas) ---
+    def historial_vehiculo(self, vehiculo, limite=50):
+        """[(ts, (códigos...), fecha del PDF o None), ...] del vehículo, de la más reciente a la más vieja."""
+        filas = self._lectura().execute(
+            "SELECT ts, codigos, pdf FROM busquedas WHERE vehiculo = ? ORDER BY ts DESC LIMIT ?",
+            (normalizar_vehiculo(vehiculo), limite)).fetchall()
+        return [(ts, tuple(codigos.split()), pdf) for ts, codigos, pdf in filas]
+
+    def vehiculos_con_codigo(self, codigo, limite=50):
+        """[(vehiculo, veces, última vez), ...] que registraron `codigo`."""
+        return self._lectura().execute(
+            "SELECT b.vehiculo, COUNT(*), MAX(b.ts) FROM busqueda_codigos c JOIN busquedas b ON b.id = c.busqueda_id"
+            " WHERE c.codigo = ? AND b.vehiculo IS NOT NULL GROUP BY b.vehiculo ORDER BY MAX(b.ts) DESC LIMIT ?",
+            (codigo, limite)).fetchall()
+
+    def codigos_frecuentes(self, limite=20, desde=None):
+        """[(código, búsquedas, vehículos distintos), ...] ordenado por frecuencia; `desde` = epoch."""
+        if desde is None:
+            sql = ("SELECT codigo, COUNT(*) AS n, COUNT(DISTINCT b.vehiculo) FROM busqueda_codigos c"
+                   " JOIN busquedas b ON b.id = c.busqueda_id GROUP BY codigo ORDER BY n DESC, codigo LIMIT ?")
+            parametros = (limite,)
+        else:
+            # CROSS JOIN fija el orden en SQLite: rango por ts primero, después sus códigos
+            sql = ("SELECT codigo, COUNT(*) AS n, COUNT(DISTINCT b.vehiculo) FROM busquedas b"
+                   " CROSS JOIN busqueda_codigos c ON c.busqueda_id = b.id WHERE b.ts >= ?"
+                   " GROUP BY codigo ORDER BY n DESC, codigo LIMIT ?")
+            parametros = (desde, limite)
+        return self._lectura().execute(sql, parametros).fetchall()
+
+    def total(self):
+        return self._lectura().execute("SELECT COUNT(*) FROM busquedas").fetchone()[0]
+
+
+def abrir(path):
+    """Historial en `path`; None si `path` está vacío (historial desactivado)."""
+    if not path:
+        return None
+    return Historial(path)
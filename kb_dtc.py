@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# 📚 Base de conocimiento DTC compilada (formato binario + mmap)
+#
+# La fuente legible es un CSV (kb/dtc_base.csv) con columnas:
+#   codigo, subsistema, descripcion, es_motor, fabricante
+# y se compila a un archivo binario con tabla de strings deduplicada. Los P0001–P0999 genéricos
+# NO van en el CSV: su fuente es RANGOS_DTC en la app (una sola fuente por código); el CSV suma
+# lo que la tabla interna no cubre (P1/P2/P3, B, C, U) y los sets de fabricante. El archivo
+# se abre con mmap: no se carga entero en memoria y cada registro se decodifica
+# recién cuando se consulta, así el arranque no crece con el tamaño de la base.
+#
+# Formato (little-endian):
+#   Cabecera  : MAGIC(8) n_registros n_fabricantes off_fabricantes off_registros off_strings (u32)
+#   Fabricantes: n_fabricantes × u32 offset al nombre (índice 0 = genérico, "")
+#   Registros : n_registros × (clave u32, off_subsistema u32, off_desc u32, flags u32),
+#               ordenados por clave = (id_fabricante << 16) | DTC SAE de 16 bits
+#   Strings   : cada string una sola vez, u16 longitud + UTF-8
+#
+# Ejecutar:
+#   python kb_dtc.py compilar kb/dtc_base.csv kb/dtc_base.dtckb
+
+import csv
+import mmap
+import os
+import struct
+import sys
+from functools import lru_cache
+
+MAGIC = b"DTCKB\x00\x01\x00"
+_CABECERA = struct.Struct("<8s5I")
+_REGISTRO = struct.Struct("<4I")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+FLAG_MOTOR = 1
+
+KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb", "dtc_base.dtckb")
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb", "dtc_base.csv")
+
+# Primer carácter del DTC → 2 bits altos de la codificación SAE J2012
+FAMILIAS = "PCBU"
+
+
+def codificar_dtc(codigo):
+    """'P0171' → entero de 16 bits según SAE J2012 (familia, 2.º dígito 0–3, 3 dígitos hex)."""
+    codigo = codigo.strip().upper()
+    if len(codigo) != 5 or codigo[0] not in FAMILIAS or codigo[1] not in "0123":
+        raise ValueError(f"DTC inválido: {codigo!r}")
+    return (FAMILIAS.index(codigo[0]) << 14) | (int(codigo[1]) << 12) | int(codigo[2:], 16)
+
+
+def decodificar_dtc(valor):
+    return f"{FAMILIAS[valor >> 14]}{(valor >> 12) & 0x3}{valor & 0xFFF:03X}"
+
+
+def es_p0_interno(codigo):
+    """True para P0001–P0999 numéricos: los define la tabla interna de la app (RANGOS_DTC)."""
+    codigo = codigo.strip().upper()
+    return codigo[:2] == "P0" and codigo[2:].isdigit() and 1 <= int(codigo[2:]) <= 999
+
+
+# =================== BUILD ===================
+def compilar(csv_path, out_path):
+    """Compila el CSV fuente al formato binario. Devuelve (registros, strings únicos)."""
+    strings = {}
+    blob = bytearray()
+
+    def intern(texto):
+        off = strings.get(texto)
+        if off is None:
+            datos = texto.encode("utf-8")
+            off = strings[texto] = len(blob)
+            blob.extend(_U16.pack(len(datos)))
+            blob.extend(datos)
+        return off
+
+    fabricantes = {"": 0}
+    registros = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for linea, fila in enumerate(csv.DictReader(f), 2):
+            fab = (fila.get("fabricante") or "").strip()
+            if not fab and es_p0_interno(fila["codigo"]):
+                raise ValueError(f"{csv_path}:{linea}: {fila['codigo'].strip()} es un P0 genérico; "
+                                 "se edita en RANGOS_DTC (app), no en el CSV")
+            fab_id = fabricantes.setdefault(fab, len(fabricantes))
+            clave = (fab_id << 16) | codificar_dtc(fila["codigo"])
+            flags = FLAG_MOTOR if fila.get("es_motor", "1").strip() in ("1", "true", "True", "si", "sí") else 0
+            registros[clave] = (intern(fila["subsistema"].strip()), intern(fila["descripcion"].strip()), flags)
+
+    fab_offsets = [intern(nombre) for nombre in sorted(fabricantes, key=fabricantes.get)]
+    off_fab = _CABECERA.size
+    off_reg = off_fab + _U32.size * len(fab_offsets)
+    off_str = off_reg + _REGISTRO.size * len(registros)
+
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_CABECERA.pack(MAGIC, len(registros), len(fab_offsets), off_fab, off_reg, off_str))
+        for off in fab_offsets:
+            f.write(_U32.pack(off))
+        for clave in sorted(registros):
+            f.write(_REGISTRO.pack(clave, *registros[clave]))
+        f.write(blob)
+    os.replace(tmp, out_path)
+    return len(registros), len(strings)
+
+
+# =================== LOADER ===================
+class BaseDTC:
+    """Lector de la base compilada. Las consultas hacen búsqueda binaria sobre el mmap."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_registros, n_fab, off_fab, self._off_reg, self._off_str = _CABECERA.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: no es una base DTC compilada")
+        self.fabricantes = {
+            self._string(_U32.unpack_from(self._mm, off_fab + i * _U32.size)[0]): i for i in range(n_fab)
+        }
+        self._string = lru_cache(maxsize=4096)(self._string)
+
+    def _string(self, off):
+        pos = self._off_str + off
+        (n,) = _U16.unpack_from(self._mm, pos)
+        return self._mm[pos + 2:pos + 2 + n].decode("utf-8")
+
+    def _buscar(self, clave):
+        lo, hi = 0, self.n_registros
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (k,) = _U32.unpack_from(self._mm, self._off_reg + mid * _REGISTRO.size)
+            if k < clave:
+                lo = mid + 1
+            elif k > clave:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def info(self, codigo, fabricante=""):
+        """(subsistema, descripción, es_motor) o None. Cae a la base genérica si el fabricante no lo define."""
+        try:
+            dtc = codificar_dtc(codigo)
+        except ValueError:
+            return None
+        ids = [self.fabricantes[fabricante]] if fabricante in self.fabricantes else []
+        for fab_id in ids + [0]:
+            i = self._buscar((fab_id << 16) | dtc)
+            if i >= 0:
+                _, off_sub, off_desc, flags = _REGISTRO.unpack_from(self._mm, self._off_reg + i * _REGISTRO.size)
+                return (self._string(off_sub), self._string(off_desc), bool(flags & FLAG_MOTOR))
+        return None
+
+    def __len__(self):
+        return self.n_registros
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def abrir(path=KB_PATH):
+    """Abre la base compilada; None si todavía no se ejecutó el paso de build."""
+    if not os.path.exists(path):
+        return None
+    return BaseDTC(path)
+
+
+def main(argv):
+    if argv and argv[0] == "compilar":
+        origen = argv[1] if len(argv) > 1 else CSV_PATH
+        destino = argv[2] if len(argv) > 2 else KB_PATH
+        n, unicos = compilar(origen, destino)
+        print(f"{destino}: {n} códigos, {unicos} strings únicos, {os.path.getsize(destino)} bytes")
+        return 0
+    print("uso: python kb_dtc.py compilar [csv] [salida]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
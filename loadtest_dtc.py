@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# 📈 Prueba de carga: página inicial (HTTP) + sesión PyWebIO completa (websocket)
+#
+# Ejecutar:
+#   python loadtest_dtc.py --url http://localhost:8080            # contra un servidor ya levantado
+#   python loadtest_dtc.py --comparar 1 4                          # levanta gunicorn con 1 y 4 workers
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import websockets
+
+from metricas_dtc import DeflateWS
+
+FIN_SESION = "©"  # el último put_text de app(): la sesión ya quedó renderizada
+BOTON_BUSCAR = "Buscar por código"
+ESPERA_S = 30  # sin respuesta del servidor en este tiempo, la sesión falla (no cuelga la corrida)
+
+
+async def _get(host, port, path="/"):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    estado = await reader.readline()
+    await reader.read()
+    writer.close()
+    if b" 200 " not in estado:
+        raise RuntimeError(estado.decode(errors="replace").strip())
+
+
+async def _esperar(ws, condicion, cada=None, timeout=ESPERA_S):
+    limite = time.monotonic() + timeout
+    while True:
+        msg = await asyncio.wait_for(ws.recv(), max(0.0, limite - time.monotonic()))
+        if cada is not None:
+            cada(msg)
+        if condicion(msg):
+            return msg
+
+
+async def _sesion(ws_url, codigos=None, conteo=None):
+    """Abre la app y, si se pasan códigos, hace una búsqueda como lo haría el navegador.
+
+    Con `conteo` (un dict) suma los mensajes y bytes que manda el servidor por la búsqueda:
+    sin comprimir y con permessage-deflate estimado (el contexto incluye la carga de la página).
+    """
+    medir = contar = None
+    if conteo is not None:
+        deflate = DeflateWS()
+        conteo.update(mensajes=0, bytes=0, deflate=0)
+
+        def medir(msg):
+            return deflate.medir(msg.encode("utf-8"))
+
+        def contar(msg):
+            conteo["mensajes"] += 1
+            conteo["bytes"] += len(msg.encode("utf-8"))
+            conteo["deflate"] += medir(msg)
+
+    compresion = None if conteo is not None else "deflate"
+    async with websockets.connect(ws_url, max_size=None, compression=compresion) as ws:
+        fila = await _esperar(ws, lambda m: BOTON_BUSCAR in m, medir)
+        await _esperar(ws, lambda m: FIN_SESION in m, medir)
+        if not codigos:
+            return
+        callback = re.search(r'"callback_id": ?"([^"]+)"', fila).group(1)
+        await ws.send(json.dumps({"event": "callback", "task_id": callback, "data": 0}))
+        form = json.loads(await _esperar(ws, lambda m: '"input_group"' in m, medir))
+        # PyWebIO exige exactamente los campos del formulario (con historial también "vehiculo")
+        datos = {campo["name"]: "" for campo in form["spec"]["inputs"]}
+        datos["codes"] = codigos
+        await ws.send(json.dumps({"event": "from_submit", "task_id": form["task_id"], "data": datos}))
+        ultima = codigos.split()[-1]
+        await _esperar(ws, lambda m: f"dtc_{ultima}" in m, contar)
+
+
+async def _cliente(url, fin, lat_http, lat_ws, errores, codigos=None):
+    u = urlparse(url)
+    ws_url = f"ws://{u.hostname}:{u.port}/?app=index"
+    while time.perf_counter() < fin:
+        try:
+            t0 = time.perf_counter()
+            await _get(u.hostname, u.port)
+            t1 = time.perf_counter()
+            await _sesion(ws_url, codigos)
+            t2 = time.perf_counter()
+            lat_http.append(t1 - t0)
+            lat_ws.append(t2 - t1)
+        except Exception:
+            errores.append(1)
+
+
+def _p(valores, q):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(q * len(valores)))] if valores else float("nan")
+
+
+async def correr(url, clientes, duracion, codigos=None):
+    lat_http, lat_ws, errores = [], [], []
+    fin = time.perf_counter() + duracion
+    await asyncio.gather(*(_cliente(url, fin, lat_http, lat_ws, errores, codigos) for _ in range(clientes)))
+    return {
+        "req_s": len(lat_http) / duracion,
+        "http_p50_ms": _p(lat_http, 0.50) * 1e3,
+        "http_p99_ms": _p(lat_http, 0.99) * 1e3,
+        "sesion_p50_ms": _p(lat_ws, 0.50) * 1e3,
+        "sesion_p99_ms": _p(lat_ws, 0.99) * 1e3,
+        "errores": len(errores),
+    }
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar_puerto(port, timeout=30):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"el servidor no abrió el puerto {port}")
+
+
+def comparar(workers, clientes, duracion, codigos=None):
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+    for n in workers:
+        port = _puerto_libre()
+        entorno = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(n))
+        proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=carpeta,
+                                env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _esperar_puerto(port)
+            yield n, asyncio.run(correr(f"http://127.0.0.1:{port}", clientes, duracion, codigos))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def _imprimir(etiqueta, r):
+    print(f"{etiqueta:<12} {r['req_s']:8.1f} req/s   HTTP p50 {r['http_p50_ms']:7.1f} ms  p99 {r['http_p99_ms']:7.1f} ms   "
+          f"sesión p50 {r['sesion_p50_ms']:7.1f} ms  p99 {r['sesion_p99_ms']:7.1f} ms   errores {r['errores']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga del Asistente DTC")
+    ap.add_argument("--url", help="servidor ya levantado (ej. http://localhost:8080)")
+    ap.add_argument("--comparar", nargs="+", type=int, metavar="WORKERS",
+                    help="levanta gunicorn con cada cantidad de workers y compara")
+    ap.add_argument("--clientes", type=int, default=32)
+    ap.add_argument("--duracion", type=float, default=10.0)
+    ap.add_argument("--codigos", help="además de abrir la sesión, buscar estos códigos (ej. 'P0171 P0300')")
+    args = ap.parse_args()
+
+    if args.url:
+        _imprimir("servidor", asyncio.run(correr(args.url, args.clientes, args.duracion, args.codigos)))
+    for n, r in comparar(args.comparar or [], args.clientes, args.duracion, args.codigos):
+        _imprimir(f"{n} worker(s)", r)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# 📊 Métricas en formato de texto Prometheus + perfilador por muestreo
+#
+# Sin dependencias: contadores, histogramas (con cuantiles de las últimas observaciones),
+# medidores calculados al momento del scrape y tasa por minuto. Todo es por proceso y cada serie
+# lleva la etiqueta worker="<pid>": con varios workers de gunicorn cada scrape ve el que atendió
+# el pedido, y sin la etiqueta los contadores de dos procesos se alternarían en la misma serie
+# (Prometheus lo leería como reinicios). Se agrega con sum without (worker) (...).
+#
+# El perfilador toma cada `intervalo_s` la pila de todos los hilos (sys._current_frames)
+# y acumula pilas "plegadas" (formato de flamegraph.pl / speedscope). Está apagado por defecto.
+#
+# MedidorWS (middleware ASGI, opcional) cuenta los bytes que cada websocket envía por ráfaga
+# (una búsqueda = una ráfaga de mensajes), sin comprimir y con permessage-deflate estimado.
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from collections import Counter, deque
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUANTILES = (0.5, 0.9, 0.99)
+MUESTRAS_CUANTILES = 1024
+
+_registro = []
+
+
+def _etiquetas(*pares):
+    """'{worker="<pid>",k="v",...}' para una línea de muestra."""
+    return "{" + ",".join([f'worker="{os.getpid()}"'] + [f'{k}="{v}"' for k, v in pares]) + "}"
+
+
+def _formato(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    def __init__(self, nombre, ayuda):
+        self.nombre, self.ayuda = nombre, ayuda
+        self.valor = 0
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def inc(self, n=1):
+        with self._lock:
+            self.valor += n
+
+    def exponer(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter",
+                f"{self.nombre}{_etiquetas()} {_formato(self.valor)}"]
+
+
+class Histograma:
+    """Buckets acumulados (para histogram_quantile) + p50/p90/p99 de las últimas observaciones."""
+
+    def __init__(self, nombre, ayuda, buckets=BUCKETS_SEGUNDOS):
+        self.nombre, self.ayuda = nombre, ayuda
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._cuentas = [0] * len(self.buckets)
+        self._suma = 0.0
+        self._recientes = deque(maxlen=MUESTRAS_CUANTILES)
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor):
+        with self._lock:
+            self._cuentas[bisect_left(self.buckets, valor)] += 1
+            self._suma += valor
+            self._recientes.append(valor)
+
+    def cuantiles(self):
+        with self._lock:
+            muestras = sorted(self._recientes)
+        if not muestras:
+            return {}
+        return {q: muestras[min(len(muestras) - 1, int(q * len(muestras)))] for q in CUANTILES}
+
+    def exponer(self):
+        with self._lock:
+            cuentas, suma = list(self._cuentas), self._suma
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        acumulado = 0
+        for limite, n in zip(self.buckets, cuentas):
+            acumulado += n
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(('le', _formato(limite)))} {acumulado}")
+        lineas += [f"{self.nombre}_sum{_etiquetas()} {_formato(suma)}", f"{self.nombre}_count{_etiquetas()} {acumulado}"]
+        cuantiles = self.cuantiles()
+        if cuantiles:
+            lineas += [f"# HELP {self.nombre}_reciente {self.ayuda} (últimas {MUESTRAS_CUANTILES} observaciones)",
+                       f"# TYPE {self.nombre}_reciente gauge"]
+            lineas += [f"{self.nombre}_reciente{_etiquetas(('quantile', q))} {_formato(v)}"
+                       for q, v in cuantiles.items()]
+        return lineas
+
+
+class Medidor:
+    """Valor calculado en cada scrape: fn() → número, o {etiqueta: número} con `etiqueta`."""
+
+    def __init__(self, nombre, ayuda, fn, etiqueta=None):
+        self.nombre, self.ayuda, self.fn, self.etiqueta = nombre, ayuda, fn, etiqueta
+        _registro.append(self)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        valor = self.fn()
+        if self.etiqueta is None:
+            return lineas + [f"{self.nombre}{_etiquetas()} {_formato(valor)}"]
+        return lineas + [f"{self.nombre}{_etiquetas((self.etiqueta, k))} {_formato(v)}" for k, v in valor.items()]
+
+
+class Tasa:
+    """Eventos en los últimos `ventana_s` segundos (ej. búsquedas por minuto)."""
+
+    def __init__(self, ventana_s=60.0):
+        self.ventana_s = ventana_s
+        self._eventos = deque()
+        self._lock = threading.Lock()
+
+    def marcar(self, ahora=None):
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            self._eventos.append(ahora)
+            self._recortar(ahora)
+
+    def _recortar(self, ahora):
+        while self._eventos and ahora - self._eventos[0] > self.ventana_s:
+            self._eventos.popleft()
+
+    def valor(self):
+        with self._lock:
+            self._recortar(time.monotonic())
+            return len(self._eventos)
+
+
+class cronometro:
+    """with cronometro(histograma): ... → observa los segundos transcurridos."""
+
+    __slots__ = ("histograma", "inicio", "segundos")
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self.inicio
+        self.histograma.observar(self.segundos)
+        return False
+
+
+def exponer():
+    """Todas las métricas registradas, en formato de texto de Prometheus 0.0.4."""
+    lineas = []
+    for metrica in _registro:
+        lineas += metrica.exponer()
+    return "\n".join(lineas) + "\n"
+
+
+# =================== PERFILADOR POR MUESTREO ===================
+class Perfilador:
+    def __init__(self, intervalo_s=0.01, max_profundidad=40):
+        self.intervalo_s = intervalo_s
+        self.max_profundidad = max_profundidad
+        self.pilas = Counter()
+        self.muestras = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._activo = threading.Event()
+
+    @property
+    def activo(self):
+        return self._activo.is_set()
+
+    def iniciar(self):
+        if self.activo:
+            return
+        with self._lock:
+            self.pilas.clear()
+            self.muestras = 0
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._muestrear, name="dtc-perfil", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._activo.clear()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while self._activo.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while frame is not None and len(pila) < self.max_profundidad:
+                    codigo = frame.f_code
+                    pila.append(f"{codigo.co_filename.rsplit('/', 1)[-1]}:{codigo.co_name}")
+                    frame = frame.f_back
+                with self._lock:
+                    self.pilas[";".join(reversed(pila))] += 1
+            self.muestras += 1
+            time.sleep(self.intervalo_s)
+
+    def plegado(self):
+        """Pilas plegadas ('a;b;c N' por línea), de la más frecuente a la menos."""
+        with self._lock:
+            pilas = self.pilas.most_common()
+        return "".join(f"{pila} {n}\n" for pila, n in pilas)
+
+
+# =================== BYTES POR WEBSOCKET ===================
+class DeflateWS:
+    """Bytes de cada mensaje con permessage-deflate (RFC 7692): un compresor por conexión con
+    contexto compartido entre mensajes, como lo negocian uvicorn/websockets por defecto."""
+
+    def __init__(self):
+        self._z = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def medir(self, datos):
+        # El mensaje termina en un flush de sincronización sin su cola 00 00 ff ff (4 bytes).
+        return len(self._z.compress(datos) + self._z.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+class MedidorWS:
+    """Middleware ASGI: reportar(ruta, mensajes, bytes, bytes_deflate) por cada ráfaga de envíos
+    de un websocket (se cierra tras `pausa_s` sin envíos)."""
+
+    def __init__(self, app, reportar, pausa_s=0.3):
+        self.app, self.reportar, self.pausa_s = app, reportar, pausa_s
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.app(scope, receive, send)
+        loop = asyncio.get_running_loop()
+        deflate = DeflateWS()
+        rafaga = {"mensajes": 0, "bytes": 0, "deflate": 0, "timer": None}
+
+        def cerrar():
+            if rafaga["mensajes"]:
+                self.reportar(scope.get("path", ""), rafaga["mensajes"], rafaga["bytes"], rafaga["deflate"])
+            rafaga.update(mensajes=0, bytes=0, deflate=0, timer=None)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "websocket.send":
+                datos = mensaje.get("bytes") or mensaje.get("text", "").encode("utf-8")
+                rafaga["mensajes"] += 1
+                rafaga["bytes"] += len(datos)
+                rafaga["deflate"] += deflate.medir(datos)
+                if rafaga["timer"] is not None:
+                    rafaga["timer"].cancel()
+                rafaga["timer"] = loop.call_later(self.pausa_s, cerrar)
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if rafaga["timer"] is not None:
+                rafaga["timer"].cancel()
+            cerrar()
@@ -0,0 +1,29 @@
+/* Barra social (IG/FB) + botón flotante de WhatsApp — se sirve versionado desde /assets. */
+(function () {
+  var html = `
+    <!-- Barra social -->
+    <div class="social-bar">
+      <a class="ig" href="{{IG_URL}}" target="_blank" rel="noopener" aria-label="Instagram">
+        <svg viewBox="0 0 448 512"><path d="M224,202.66A53.34,53.34,0,1,0,277.34,256,53.38,53.38,0,0,0,224,202.66Zm124.71-41.37a31.11,31.11,0,1,0,31.11,31.11A31.11,31.11,0,0,0,348.71,161.29ZM398.8,80A93.2,93.2,0,0,0,368,64.47C335.86,53.67,265.71,48,224,48S112.14,53.67,80,64.47A93.2,93.2,0,0,0,49.2,80C36.91,92.28,24.63,114,21.2,148.06,17.29,188,16,233.38,16,256s1.29,68,5.2,107.94C24.63,398,36.91,419.72,49.2,432A93.2,93.2,0,0,0,80,447.53C112.14,458.33,182.29,464,224,464s112.14-5.67,144-16.47A93.2,93.2,0,0,0,398.8,432c12.29-12.28,24.57-34,28-68.06C429.71,324,431,278.62,431,256s-1.29,68-4.2-107.94C423.37,114,411.09,92.28,398.8,80ZM224,338.67A82.67,82.67,0,1,1,306.67,256,82.76,82.76,0,0,1,224,338.67Z"/></svg>
+        Instagram
+      </a>
+      <a class="fb" href="{{FB_URL}}" target="_blank" rel="noopener" aria-label="Facebook">
+        <svg viewBox="0 0 320 512"><path d="M279.14 288l14.22-92.66h-88.91V128c0-25.35 12.42-50.06 52.24-50.06H295V6.26S273.91 0 252.36 0c-73.22 0-121.07 44.38-121.07 124.72V195.3H56.89V288h74.4v224h92.66V288z"/></svg>
+        Facebook
+      </a>
+    </div>
+
+    <!-- Botón flotante WhatsApp con pulsación continua -->
+    <a class="wa-fab pulse" id="waFab" href="{{WA_URL}}" target="_blank" rel="noopener" aria-label="WhatsApp">
+      <svg viewBox="0 0 448 512">
+        <path d="M380.9 97.1C339-7.8 241.4-30.2 160 23.2 78.6 76.7 46.9 176 80.5 261.9l-19.4 70.3 72.1-18.9c47.6 25.6 104.1 27.9 152.2 6.3 88.8-41.2 127.5-145.1 95.5-222.5zM224 367.8c-26.8 0-52.9-6.6-76.2-19.1l-5.4-3-42.8 11.2 11.4-41.5-3.5-5.7C83.1 275.2 74.9 246 74.9 216c0-81.4 66.4-147.8 147.8-147.8s147.8 66.4 147.8 147.8S305.4 367.8 224 367.8zM309.5 282c-4.1-2-24.3-12-28.1-13.4-3.8-1.4-6.6-2-9.4 2-2.8 3.9-10.8 13.4-13.3 16.1-2.5 2.8-4.9 3-9 1.1-4.1-2-17.1-6.3-32.5-20.1-12-10.7-20.1-23.9-22.5-28-2.3-4.1-.2-6.3 1.7-8.2 1.7-1.7 3.9-4.5 5.8-6.7 1.9-2.2 2.5-3.9 3.8-6.6 1.2-2.8 .6-5.2-.3-7.3-.9-2-8.3-20-11.4-27.3-3-7.3-6.1-6.3-8.4-6.4-2.1-.1-4.6-.1-7.1-.1-2.5 0-6.6 .9-10 4.5-3.4 3.7-13.1 12.8-13.1 31.2s13.4 36.2 15.3 38.7c1.9 2.5 26.3 40.2 63.9 56.3 8.9 3.8 15.8 6.1 21.2 7.8 8.9 2.8 17 2.4 23.4 1.5 7.1-1 24.3-9.9 27.8-19.5 3.5-9.6 3.5-17.9 2.4-19.5-1.1-1.5-3.9-2.5-8.1-4.5z"/>
+      </svg>
+    </a>
+  `;
+  function montar() { document.body.insertAdjacentHTML("beforeend", html); }
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", montar);
+  } else {
+    montar();
+  }
+})();